@@ -257,6 +257,86 @@ updateJsonTemplateButton.addEventListener("click", () => {
   saveJsonTemplate({ id: selected.id });
 });
 
+const imageInput = document.getElementById("image");
+const PREVIEW_DELAY_MS = 120;
+let imageId = null;
+let imageGeneration = 0;
+let previewUrl = null;
+let previewTimer = null;
+let previewInFlight = false;
+let previewQueued = false;
+
+function showPreview(src) {
+  preview.src = src;
+  preview.classList.remove("hidden");
+  placeholder.classList.add("hidden");
+}
+
+// Draft renders are cheap, so re-render as the user types; only the newest request is kept queued.
+async function requestPreview() {
+  if (previewInFlight) {
+    previewQueued = true;
+    return;
+  }
+  if (!imageId && !(imageInput && imageInput.files.length)) {
+    return;
+  }
+
+  const formData = new FormData(form);
+  if (imageId) {
+    formData.delete("image");
+    formData.set("image_id", imageId);
+  }
+
+  const generation = imageGeneration;
+  previewInFlight = true;
+  try {
+    const response = await fetch("/preview", { method: "POST", body: formData });
+    if (!response.ok) {
+      const result = await response.json().catch(() => ({}));
+      if (response.status === 400) {
+        imageId = null;
+      }
+      throw new Error(result.error || "Failed to render preview.");
+    }
+    if (generation === imageGeneration) {
+      imageId = response.headers.get("X-Image-Id") || imageId;
+    }
+    const blob = await response.blob();
+    if (previewUrl) {
+      URL.revokeObjectURL(previewUrl);
+    }
+    previewUrl = URL.createObjectURL(blob);
+    showPreview(previewUrl);
+    statusBadge.textContent = "Preview";
+  } catch (error) {
+    statusBadge.textContent = error.message;
+  } finally {
+    previewInFlight = false;
+    if (previewQueued) {
+      previewQueued = false;
+      requestPreview();
+    }
+  }
+}
+
+function schedulePreview() {
+  clearTimeout(previewTimer);
+  previewTimer = setTimeout(requestPreview, PREVIEW_DELAY_MS);
+}
+
+if (imageInput) {
+  imageInput.addEventListener("change", () => {
+    imageId = null;
+    imageGeneration += 1;
+    schedulePreview();
+  });
+}
+form.addEventListener("input", (event) => {
+  if (event.target !== imageInput) {
+    schedulePreview();
+  }
+});
 form.addEventListener("submit", async (event) => {
   event.preventDefault();
   statusBadge.textContent = "Generating...";
@@ -269,15 +349,18 @@ form.addEventListener("submit", async (event) => {
       body: formData
     });
 
-    const result = await response.json();
-
     if (!response.ok) {
+      const result = await response.json().catch(() => ({}));
       throw new Error(result.error || "Failed to generate image.");
     }
 
-    preview.src = `${result.output}?t=${Date.now()}`;
-    preview.classList.remove("hidden");
-    placeholder.classList.add("hidden");
+    imageId = response.headers.get("X-Image-Id") || imageId;
+    const blob = await response.blob();
+    if (previewUrl) {
+      URL.revokeObjectURL(previewUrl);
+    }
+    previewUrl = URL.createObjectURL(blob);
+    showPreview(previewUrl);
     statusBadge.textContent = "Generated";
   } catch (error) {
     statusBadge.textContent = "Error";
@@ -0,0 +1,120 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from python.bench.fixtures import FIXTURES_DIR, SOURCE_SIZES
+from python.bench.suite import (
+    FORMATS,
+    build_cases,
+    compare,
+    environment,
+    format_table,
+    result_rows,
+    run_suite,
+    warm_up_imports,
+)
+
+
+def split_list(value: str) -> list:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def run_command(args: argparse.Namespace) -> None:
+    unknown = [size for size in args.sizes if size not in SOURCE_SIZES]
+    if unknown:
+        raise SystemExit(f"Error: unknown source sizes {unknown} (have {', '.join(SOURCE_SIZES)})")
+    try:
+        cases = build_cases(
+            sizes=args.sizes,
+            formats=args.formats,
+            templates=args.templates or None,
+            include_generate=not args.no_generate,
+            fixtures_dir=Path(args.fixtures_dir),
+        )
+    except ValueError as exc:
+        raise SystemExit(f"Error: {exc}") from exc
+
+    warm_up_imports()
+    started = time.perf_counter()
+    results = []
+    for result in run_suite(cases, repeat=args.repeat, warmup=args.warmup):
+        results.append(result)
+        print(
+            f"{result['name']}: cold {result['cold_ms']:.1f} ms, warm p50 {result['warm']['p50_ms']:.1f} ms",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    report = {
+        "environment": environment(),
+        "settings": {"repeat": args.repeat, "warmup": args.warmup},
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "results": results,
+    }
+    print(format_table(["case", "cold ms", "p50 ms", "p90 ms", "renders/s", "rss MB"], result_rows(results)))
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2))
+        print(f"Saved {len(results)} results to {out}", file=sys.stderr)
+
+
+def compare_command(args: argparse.Namespace) -> None:
+    try:
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+    except (OSError, json.JSONDecodeError) as exc:
+        raise SystemExit(f"Error: {exc}") from exc
+
+    rows = compare(baseline, current, args.metric, args.threshold)
+    print(
+        format_table(
+            ["case", "baseline", "current", "change", ""],
+            [
+                [
+                    row["name"],
+                    f"{row['baseline']:.1f}",
+                    f"{row['current']:.1f}",
+                    f"{row['change'] * 100:+.1f}%",
+                    "REGRESSION" if row["regression"] else "",
+                ]
+                for row in rows
+            ],
+        )
+    )
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} of {len(rows)} cases regressed beyond {args.threshold:.0%} on {args.metric}", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m python.bench", description="Benchmark the thumbnail renderers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark matrix")
+    run.add_argument("--sizes", type=split_list, default=list(SOURCE_SIZES), help="Comma-separated source sizes")
+    run.add_argument("--formats", type=split_list, default=list(FORMATS), help="Comma-separated output formats")
+    run.add_argument("--templates", type=split_list, help="Comma-separated template names (default: all)")
+    run.add_argument("--no-generate", action="store_true", help="Skip generate_thumbnail cases")
+    run.add_argument("--repeat", type=int, default=5, help="Warm runs per case")
+    run.add_argument("--warmup", type=int, default=1, help="Untimed runs between the cold and warm runs")
+    run.add_argument("--fixtures-dir", default=str(FIXTURES_DIR), help="Where generated fixtures are kept")
+    run.add_argument("--out", help="Write results JSON here")
+    run.set_defaults(handler=run_command)
+
+    diff = commands.add_parser("compare", help="Compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--metric", default="p50_ms", help="Warm metric (p50_ms, p90_ms, ...) or cold_ms, peak_rss_mb")
+    diff.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before failing, e.g. 0.10")
+    diff.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
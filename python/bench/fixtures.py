@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from python.make_sample_assets import CORPUS_SIZES, make_source
+
+ROOT = Path(__file__).resolve().parents[2]
+FIXTURES_DIR = ROOT / "out" / "bench" / "fixtures"
+
+SOURCE_SIZES: Dict[str, Tuple[int, int]] = {
+    label: CORPUS_SIZES[label] for label in ("720p", "1080p", "4k", "12mp", "48mp")
+}
+
+BOLD_FONT = "assets/fonts/DejaVuSans-Bold.ttf"
+REGULAR_FONT = "assets/fonts/DejaVuSans.ttf"
+
+
+def text_layer(name: str, x: int, y: int, size: int, shadow_blur: int = 0, anchor: str = "top_left") -> Dict[str, Any]:
+    layer: Dict[str, Any] = {
+        "type": "text",
+        "name": name,
+        "anchor": anchor,
+        "position": {"x": x, "y": y},
+        "font": {"path": BOLD_FONT if size >= 48 else REGULAR_FONT, "size": size},
+        "fill": "#FFFFFF",
+        "stroke": {"color": "#000000", "width": max(size // 10, 2)},
+        "line_spacing": 6,
+        "align": "left",
+        "text": "{{" + name + "}}",
+    }
+    if shadow_blur:
+        layer["shadow"] = {"blur": shadow_blur, "offset": {"x": 4, "y": 4}, "color": "#000000", "opacity": 0.6}
+    return layer
+
+
+def panel_layer(name: str, x: int, y: int, width: int, height: int, blur: int) -> Dict[str, Any]:
+    return {
+        "type": "panel",
+        "name": name,
+        "anchor": "top_left",
+        "position": {"x": x, "y": y},
+        "size": {"width": width, "height": height},
+        "fill": {"color": "#0F172A", "opacity": 0.7},
+        "shadow": {"blur": blur, "offset": {"x": 8, "y": 8}, "color": "#000000", "opacity": 0.6, "soft": True},
+    }
+
+
+def shadow_heavy_template() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    layers = []
+    variables = {}
+    for row in range(3):
+        for column in range(3):
+            x, y = 40 + column * 410, 40 + row * 225
+            layers.append(panel_layer(f"panel_{row}_{column}", x, y, 380, 190, blur=8 + 4 * row))
+            name = f"label_{row}_{column}"
+            layers.append(text_layer(name, x + 24, y + 60, 44, shadow_blur=10))
+            variables[name] = f"Shadow {row * 3 + column + 1}"
+    template = {"name": "bench_shadow_heavy", "canvas": {"width": 1280, "height": 720}, "layers": layers}
+    return template, variables
+
+
+def text_heavy_template() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    layers = [text_layer("title", 640, 24, 88, anchor="top_center")]
+    variables = {"title": "EVERY WORD COUNTS"}
+    for index in range(14):
+        name = f"line_{index}"
+        layers.append(text_layer(name, 60 + (index % 2) * 620, 150 + (index // 2) * 78, 34))
+        variables[name] = f"Caption {index + 1}: the quick brown fox"
+    template = {"name": "bench_text_heavy", "canvas": {"width": 1280, "height": 720}, "layers": layers}
+    return template, variables
+
+
+SYNTHETIC_TEMPLATES = {
+    "bench_shadow_heavy": shadow_heavy_template,
+    "bench_text_heavy": text_heavy_template,
+}
+
+
+def source_path(label: str, directory: Path = FIXTURES_DIR) -> Path:
+    return directory / f"texture_{label}.jpg"
+
+
+def ensure_fixtures(directory: Path = FIXTURES_DIR) -> Dict[str, Any]:
+    # Fixtures are deterministic, so existing files are reused between runs.
+    sources = {}
+    for seed, (label, (width, height)) in enumerate(SOURCE_SIZES.items()):
+        path = source_path(label, directory)
+        if not path.exists():
+            make_source(path, width, height, kind="texture", seed=seed)
+        sources[label] = path
+
+    templates = {}
+    for name, build in SYNTHETIC_TEMPLATES.items():
+        template, variables = build()
+        template_path = directory / f"{name}.json"
+        vars_path = directory / f"vars_{name}.json"
+        template_path.write_text(json.dumps(template, indent=2))
+        vars_path.write_text(json.dumps(variables, indent=2))
+        templates[name] = (template_path, vars_path)
+    return {"sources": sources, "templates": templates}
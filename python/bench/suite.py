@@ -0,0 +1,310 @@
+import gc
+import os
+import platform
+import re
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import PIL
+from PIL import Image
+
+from python import generate_thumbnail
+from python.bench.fixtures import FIXTURES_DIR, ROOT, SOURCE_SIZES, ensure_fixtures
+from python.font_cache import FONTS
+from python.outputs import OutputSpec, encode_outputs
+from python.overlay_cache import OVERLAYS
+from python.rect_effects import np
+from python.render_thumbnail import _COMPILED_TEMPLATES, compose_compiled, load_compiled_template, load_source, read_json
+from python.source_cache import SOURCES
+from python.sprite_cache import SPRITES
+
+FORMATS = ("jpg", "png", "webp")
+# Caches kept between warm runs. Decoded sources are not: a warm run still decodes and resizes the
+# input, so the decode stage and warm latency measure it rather than a cache hit.
+WARM_CACHES = ("fonts", "overlays", "compiled_templates", "sprites")
+TEMPLATES_DIR = ROOT / "assets" / "templates"
+
+Stages = Dict[str, float]
+
+
+@dataclass
+class BenchCase:
+    name: str
+    kind: str
+    source: str
+    format: str
+    input_path: Path
+    template_path: Optional[Path] = None
+    vars_path: Optional[Path] = None
+
+
+def bundled_templates() -> Dict[str, Any]:
+    templates = {}
+    for template_path in sorted(TEMPLATES_DIR.glob("*.json")):
+        if template_path.name.startswith("vars_"):
+            continue
+        vars_path = template_path.with_name(f"vars_{template_path.name}")
+        if vars_path.exists():
+            templates[template_path.stem] = (template_path, vars_path)
+    return templates
+
+
+def build_cases(
+    sizes: Sequence[str] = tuple(SOURCE_SIZES),
+    formats: Sequence[str] = FORMATS,
+    templates: Optional[Sequence[str]] = None,
+    include_generate: bool = True,
+    fixtures_dir: Path = FIXTURES_DIR,
+) -> List[BenchCase]:
+    fixtures = ensure_fixtures(fixtures_dir)
+    available = {**bundled_templates(), **fixtures["templates"]}
+    names = list(templates) if templates else list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown templates: {', '.join(unknown)} (have {', '.join(available)})")
+
+    cases = []
+    for size in sizes:
+        input_path = fixtures["sources"][size]
+        for name in names:
+            template_path, vars_path = available[name]
+            for fmt in formats:
+                cases.append(
+                    BenchCase(
+                        name=f"{name}/{size}/{fmt}",
+                        kind="template",
+                        source=size,
+                        format=fmt,
+                        input_path=input_path,
+                        template_path=template_path,
+                        vars_path=vars_path,
+                    )
+                )
+        if include_generate:
+            cases.append(BenchCase(name=f"generate/{size}/jpg", kind="generate", source=size, format="jpg", input_path=input_path))
+    return cases
+
+
+def reset_caches() -> None:
+    # Process-level caches only; the OS page cache still holds the fixture files.
+    FONTS.clear()
+    OVERLAYS.clear()
+    _COMPILED_TEMPLATES.clear()
+    SOURCES.clear()
+    SPRITES.clear()
+    gc.collect()
+
+
+def render_template_case(case: BenchCase, output_dir: Path) -> Stages:
+    stages: Stages = {}
+    started = time.perf_counter()
+    compiled = load_compiled_template(case.template_path)
+    variables = read_json(case.vars_path)
+    stages["compile"] = time.perf_counter() - started
+
+    mark = time.perf_counter()
+    base = load_source(case.input_path, compiled.template, compiled.canvas).image
+    stages["decode"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    base = compose_compiled(base, compiled, variables)
+    stages["compose"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    encode_outputs(base, [OutputSpec(output_dir / f"bench.{case.format}")])
+    stages["encode"] = time.perf_counter() - mark
+    stages["total"] = time.perf_counter() - started
+    return stages
+
+
+def render_generate_case(case: BenchCase, output_dir: Path) -> Stages:
+    payload = {
+        "image_path": str(case.input_path),
+        "main_title": "SAME MONEY. SAME JUNK.",
+        "left_caption": "$60/month for channels you don't watch.",
+        "right_caption": "$60/month for prompts you don't remember.",
+        "primary_color": "#1E3A8A",
+    }
+    started = time.perf_counter()
+    generate_thumbnail.render(payload, output_dir / "bench.jpg")
+    return {"total": time.perf_counter() - started}
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: Sequence[Stages]) -> Dict[str, Any]:
+    totals = [sample["total"] for sample in samples]
+    stage_names = [name for name in samples[0] if name != "total"] if samples else []
+    return {
+        "runs": len(samples),
+        "p50_ms": round(percentile(totals, 0.5) * 1000, 2),
+        "p90_ms": round(percentile(totals, 0.9) * 1000, 2),
+        "p99_ms": round(percentile(totals, 0.99) * 1000, 2),
+        "mean_ms": round(sum(totals) / len(totals) * 1000, 2) if totals else 0.0,
+        "throughput_per_s": round(len(totals) / sum(totals), 2) if totals and sum(totals) > 0 else 0.0,
+        "stages_p50_ms": {
+            name: round(percentile([sample[name] for sample in samples], 0.5) * 1000, 2) for name in stage_names
+        },
+    }
+
+
+def reset_peak_rss() -> bool:
+    # Linux lets a process reset its own high-water mark; elsewhere the peak is process-lifetime.
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as handle:
+            match = re.search(r"VmHWM:\s+(\d+)", handle.read())
+        if match:
+            return round(int(match.group(1)) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB elsewhere.
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def run_case(case: BenchCase, repeat: int, warmup: int, output_dir: Path) -> Dict[str, Any]:
+    render: Callable[[BenchCase, Path], Stages] = (
+        render_template_case if case.kind == "template" else render_generate_case
+    )
+    def warm_render() -> Stages:
+        SOURCES.clear()
+        return render(case, output_dir)
+
+    reset_caches()
+    rss_reset = reset_peak_rss()
+    cold = render(case, output_dir)
+    for _ in range(warmup):
+        warm_render()
+    warm = [warm_render() for _ in range(repeat)]
+    rss = peak_rss_mb()
+
+    # tracemalloc slows rendering down, so it gets its own run. It only sees Python-heap
+    # allocations; Pillow's pixel buffers show up in the RSS peak instead.
+    tracemalloc.start()
+    try:
+        warm_render()
+        _current, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    width, height = SOURCE_SIZES[case.source]
+    return {
+        "name": case.name,
+        "kind": case.kind,
+        "template": case.template_path.stem if case.template_path else "generate",
+        "source": case.source,
+        "source_size": [width, height],
+        "format": case.format,
+        "cold_ms": round(cold["total"] * 1000, 2),
+        "cold_stages_ms": {name: round(value * 1000, 2) for name, value in cold.items() if name != "total"},
+        "warm": summarize(warm),
+        "warm_caches": list(WARM_CACHES),
+        "peak_rss_mb": rss,
+        "peak_rss_scope": "case" if rss_reset else "process",
+        "tracemalloc_peak_mb": round(traced_peak / (1024 * 1024), 2),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__ if np is not None else None,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "revision": git_revision(),
+    }
+
+
+def run_suite(cases: Sequence[BenchCase], repeat: int = 5, warmup: int = 1) -> Iterator[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory(prefix="thumbnail-bench-") as tmp:
+        for case in cases:
+            yield run_case(case, repeat, warmup, Path(tmp))
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], metric: str, threshold: float) -> List[Dict[str, Any]]:
+    def value(result: Dict[str, Any]) -> float:
+        if metric in result:
+            return float(result[metric])
+        return float(result["warm"][metric])
+
+    before = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        previous = before.get(result["name"])
+        if previous is None:
+            continue
+        old, new = value(previous), value(result)
+        change = (new - old) / old if old > 0 else 0.0
+        rows.append(
+            {
+                "name": result["name"],
+                "baseline": old,
+                "current": new,
+                "change": round(change, 4),
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def result_rows(results: Sequence[Dict[str, Any]]) -> List[List[str]]:
+    return [
+        [
+            result["name"],
+            f"{result['cold_ms']:.1f}",
+            f"{result['warm']['p50_ms']:.1f}",
+            f"{result['warm']['p90_ms']:.1f}",
+            f"{result['warm']['throughput_per_s']:.1f}",
+            f"{result['peak_rss_mb']:.0f}",
+        ]
+        for result in results
+    ]
+
+
+def format_table(header: Sequence[str], rows: Sequence[Sequence[str]]) -> str:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)] if rows else [len(h) for h in header]
+    lines = ["  ".join(str(cell).ljust(width) for cell, width in zip(header, widths))]
+    lines.extend("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)) for row in rows)
+    return "\n".join(lines)
+
+
+def warm_up_imports() -> None:
+    # Pillow loads codec plugins lazily; do it before the first cold measurement.
+    Image.init()
@@ -0,0 +1,115 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from PIL import ImageFont
+
+from python.cache import LRUCache
+
+
+FONT_CATALOG = {
+    "dejavu_sans": {
+        "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "italic": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf",
+        "bold_italic": "/usr/share/fonts/truetype/dejavu/DejaVuSans-BoldOblique.ttf",
+    },
+    "dejavu_serif": {
+        "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
+        "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf",
+        "italic": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Italic.ttf",
+        "bold_italic": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-BoldItalic.ttf",
+    },
+    "liberation_sans": {
+        "regular": "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+        "bold": "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+        "italic": "/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf",
+        "bold_italic": "/usr/share/fonts/truetype/liberation/LiberationSans-BoldItalic.ttf",
+    },
+    "liberation_serif": {
+        "regular": "/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf",
+        "bold": "/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf",
+        "italic": "/usr/share/fonts/truetype/liberation/LiberationSerif-Italic.ttf",
+        "bold_italic": "/usr/share/fonts/truetype/liberation/LiberationSerif-BoldItalic.ttf",
+    },
+}
+
+FALLBACK_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+
+# A named instance ("Bold") or a list of axis values for variable fonts.
+Variation = Union[None, str, Sequence[float]]
+
+
+def _variation_key(variation: Variation) -> Union[None, str, Tuple[float, ...]]:
+    if variation is None or isinstance(variation, str):
+        return variation
+    return tuple(float(value) for value in variation)
+
+
+class FontRegistry:
+    def __init__(self, max_entries: int = 128) -> None:
+        self._fonts = LRUCache(max_entries=max_entries)
+        self._resolved: Dict[Tuple[str, str], Optional[str]] = {}
+        self._resolve_lock = threading.Lock()
+
+    def get(self, path: str, size: int, variation: Variation = None) -> ImageFont.FreeTypeFont:
+        key = (os.fspath(path), int(size), _variation_key(variation))
+        return self._fonts.get_or_create(key, lambda: self._open(*key))
+
+    def resolve(self, family: Optional[str], style: Optional[str]) -> Optional[str]:
+        family = (family or "dejavu_sans").lower()
+        style = (style or "bold").lower()
+        with self._resolve_lock:
+            if (family, style) in self._resolved:
+                return self._resolved[(family, style)]
+
+        candidates = []
+        family_entry = FONT_CATALOG.get(family)
+        if family_entry:
+            candidates.extend([family_entry.get(style), family_entry.get("bold"), family_entry.get("regular")])
+        candidates.extend(FALLBACK_FONTS)
+
+        resolved = None
+        for path in filter(None, candidates):
+            try:
+                ImageFont.truetype(path, size=12)
+            except Exception:
+                continue
+            resolved = path
+            break
+
+        with self._resolve_lock:
+            self._resolved[(family, style)] = resolved
+        return resolved
+
+    def load(self, size: int, family: Optional[str] = None, style: Optional[str] = None) -> Any:
+        path = self.resolve(family, style)
+        if path is None:
+            return ImageFont.load_default()
+        return self.get(path, size)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._fonts.stats()
+        with self._resolve_lock:
+            stats["resolved_families"] = len(self._resolved)
+        return stats
+
+    def clear(self) -> None:
+        self._fonts.clear()
+        with self._resolve_lock:
+            self._resolved.clear()
+
+    @staticmethod
+    def _open(path: str, size: int, variation: Union[None, str, Tuple[float, ...]]) -> ImageFont.FreeTypeFont:
+        font = ImageFont.truetype(path, size=size)
+        if isinstance(variation, str):
+            font.set_variation_by_name(variation)
+        elif variation is not None:
+            font.set_variation_by_axes(list(variation))
+        return font
+
+
+FONTS = FontRegistry()
@@ -1,61 +1,39 @@
+import argparse
 import json
+import os
+import queue
+import shutil
 import sys
+import threading
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageDraw
 
-TARGET_W = 1280
-TARGET_H = 720
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
 
+from python.font_cache import FONTS
+from python.outputs import OutputSpec, encode
+from python.preview import PREVIEW_QUALITY, PREVIEW_RESAMPLE, scale_length
+from python.profiling import RenderProfiler, profile_end, profile_start
+from python.rect_effects import soft_divider, soft_rect, solid_rect
+from python.render_cache import DEFAULT_MAX_BYTES, RenderCache
+from python.render_thumbnail import composite_tile
+from python.text_layout import fit_text
+from python.text_layout import wrap_text as layout_wrap_text
+from python.source_cache import SOURCES
+from python.source_image import cover_resize
 
-FONT_CATALOG = {
-    "dejavu_sans": {
-        "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-        "italic": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf",
-        "bold_italic": "/usr/share/fonts/truetype/dejavu/DejaVuSans-BoldOblique.ttf",
-    },
-    "dejavu_serif": {
-        "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
-        "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf",
-        "italic": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Italic.ttf",
-        "bold_italic": "/usr/share/fonts/truetype/dejavu/DejaVuSerif-BoldItalic.ttf",
-    },
-    "liberation_sans": {
-        "regular": "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-        "bold": "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-        "italic": "/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf",
-        "bold_italic": "/usr/share/fonts/truetype/liberation/LiberationSans-BoldItalic.ttf",
-    },
-    "liberation_serif": {
-        "regular": "/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf",
-        "bold": "/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf",
-        "italic": "/usr/share/fonts/truetype/liberation/LiberationSerif-Italic.ttf",
-        "bold_italic": "/usr/share/fonts/truetype/liberation/LiberationSerif-BoldItalic.ttf",
-    },
-}
+TARGET_W = 1280
+TARGET_H = 720
+OUTPUT_FORMAT = {"suffix": ".jpg", "quality": 95}
+# Payload keys that locate files or route jobs rather than change pixels.
+UNCACHED_KEYS = {"id", "image_path", "image_bytes", "output_path", "cache_dir", "cache_max_mb", "profile"}
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
 
 
 def load_font(size, family="dejavu_sans", style="bold"):
-    family = (family or "dejavu_sans").lower()
-    style = (style or "bold").lower()
-    candidates = []
-    family_entry = FONT_CATALOG.get(family)
-    if family_entry:
-        candidates.append(family_entry.get(style))
-        candidates.append(family_entry.get("bold"))
-        candidates.append(family_entry.get("regular"))
-    candidates.extend(
-        [
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        ]
-    )
-    for path in filter(None, candidates):
-        try:
-            return ImageFont.truetype(path, size=size)
-        except Exception:
-            continue
-    return ImageFont.load_default()
+    return FONTS.load(size, family=family, style=style)
 
 
 def parse_hex_color(value, alpha=255):
@@ -71,42 +49,88 @@ def parse_hex_color(value, alpha=255):
 
 
 def scale_crop(image):
-    scale = max(TARGET_W / image.width, TARGET_H / image.height)
-    new_size = (int(image.width * scale), int(image.height * scale))
-    resized = image.resize(new_size, Image.LANCZOS)
-    left = (resized.width - TARGET_W) // 2
-    top = (resized.height - TARGET_H) // 2
-    return resized.crop((left, top, left + TARGET_W, top + TARGET_H))
+    return cover_resize(image, TARGET_W, TARGET_H)
 
 
 def wrap_text(draw, text, font, max_width):
-    words = text.split()
-    lines = []
-    current = ""
-    for word in words:
-        test = f"{current} {word}".strip()
-        width = draw.textbbox((0, 0), test, font=font)[2]
-        if width <= max_width:
-            current = test
-        else:
-            if current:
-                lines.append(current)
-            current = word
-    if current:
-        lines.append(current)
-    return "\n".join(lines)
-
-
-def draw_outlined_text(draw, pos, text, font, fill=(255, 255, 255, 255), outline=(0, 0, 0, 255), stroke=6, align="left"):
+    # Payload captions are free text: any whitespace, newlines included, may break a line.
+    return layout_wrap_text(" ".join(text.split()), font, max_width)
+
+
+def draw_outlined_text(
+    draw, pos, text, font, fill=(255, 255, 255, 255), outline=(0, 0, 0, 255), stroke=6, align="left", spacing=4
+):
     x, y = pos
-    draw.text((x, y), text, font=font, fill=fill, stroke_width=stroke, stroke_fill=outline, align=align)
+    draw.text((x, y), text, font=font, fill=fill, stroke_width=stroke, stroke_fill=outline, align=align, spacing=spacing)
 
 
-def main():
-    payload = json.loads(sys.stdin.read())
+def render_cache_for(payload):
+    cache_dir = payload.get("cache_dir") or os.environ.get("THUMBNAIL_CACHE_DIR")
+    if not cache_dir:
+        return None
+    max_bytes = int(payload.get("cache_max_mb") or 0) * 1024 * 1024 or DEFAULT_MAX_BYTES
+    with _CACHES_LOCK:
+        cache = _CACHES.get((cache_dir, max_bytes))
+        if cache is None:
+            cache = _CACHES[(cache_dir, max_bytes)] = RenderCache(cache_dir, max_bytes=max_bytes)
+    return cache
+
 
-    image_path = Path(payload.get("image_path"))
-    output_path = Path(payload.get("output_path"))
+def generate(payload, image=None):
+    # image, when given, is the source itself (encoded bytes, a buffer, a descriptor or a file object)
+    # and image_path is not read. Without an output_path the JPEG comes back in memory as "data".
+    profiler = RenderProfiler() if payload.get("profile") else None
+    result = generate_profiled(payload, profiler, image)
+    if profiler is not None:
+        result["timings"] = profiler.timings()
+    return result
+
+
+def generate_profiled(payload, profiler, image=None):
+    output_path = Path(payload["output_path"]) if payload.get("output_path") else None
+    cache = render_cache_for(payload)
+    # Descriptors and file objects can only be read once, so they are rendered without the cache.
+    if cache is None or not (image is None or isinstance(image, (bytes, bytearray, memoryview))):
+        return render(payload, output_path, profiler, image)
+
+    mark = profile_start(profiler)
+    font_path = FONTS.resolve(payload.get("font_family") or "dejavu_sans", payload.get("font_style") or "bold")
+    key = cache.key(
+        payload.get("image_path") if image is None else image,
+        {name: value for name, value in payload.items() if name not in UNCACHED_KEYS},
+        None,
+        fonts=[font_path] if font_path else [],
+        output_format=OUTPUT_FORMAT,
+    )
+    cached = cache.lookup(key, OUTPUT_FORMAT["suffix"])
+    profile_end(profiler, mark, "cache", hit=cached is not None)
+    if cached is not None and output_path is None:
+        return {"data": cached.read_bytes(), "cache": "hit"}
+    if cached is not None:
+        cache.copy_to(cached, output_path)
+        return {"output_path": str(output_path), "cache": "hit"}
+
+    result = render(payload, output_path, profiler, image)
+    if output_path is None:
+        cache.store(key, OUTPUT_FORMAT["suffix"], lambda path: path.write_bytes(result["data"]))
+    else:
+        cache.store(key, OUTPUT_FORMAT["suffix"], lambda path: shutil.copyfile(output_path, path))
+    result["cache"] = "miss"
+    return result
+
+
+def render(payload, output_path, profiler=None, image=None):
+    image_input = image if image is not None else Path(payload.get("image_path"))
+    # Preview renders draw the same layout on a smaller canvas with cheaper resampling and encoding.
+    scale = float(payload.get("preview_scale") or 1)
+    if not 0 < scale <= 1:
+        raise ValueError("preview_scale must be in (0, 1]")
+
+    def px(value):
+        return scale_length(value, scale)
+
+    width = px(TARGET_W)
+    height = px(TARGET_H)
 
     main_title = payload.get("main_title", "")
     left_caption = payload.get("left_caption", "")
@@ -116,58 +140,192 @@ def main():
     base_font_size = payload.get("font_size") or 64
     font_family = payload.get("font_family") or "dejavu_sans"
     font_style = payload.get("font_style") or "bold"
-    banner_height = payload.get("banner_height") or int(base_font_size * 1.2) + 24
-    panel_height = payload.get("panel_height") or int(TARGET_H * 0.28)
-    panel_margin = payload.get("panel_margin") or 30
-    panel_padding = payload.get("panel_padding") or 18
-    panel_gap = payload.get("panel_gap") or 20
-    divider_width = payload.get("divider_width") or 8
+    banner_height = px(payload.get("banner_height") or int(base_font_size * 1.2) + 24)
+    panel_height = px(payload.get("panel_height") or int(TARGET_H * 0.28))
+    panel_margin = px(payload.get("panel_margin") or 30)
+    panel_padding = px(payload.get("panel_padding") or 18)
+    panel_gap = px(payload.get("panel_gap") or 20)
+    divider_width = px(payload.get("divider_width") or 8)
     divider_opacity = payload.get("divider_opacity") or 120
-    title_font = load_font(int(base_font_size), family=font_family, style=font_style)
-    sub_font = load_font(int(base_font_size * 0.6), family=font_family, style=font_style)
+    title_size = px(int(base_font_size))
+    title_font = load_font(title_size, family=font_family, style=font_style)
+    sub_font = load_font(px(int(base_font_size * 0.6)), family=font_family, style=font_style)
 
-    img = Image.open(image_path).convert("RGBA")
-    base = scale_crop(img).convert("RGBA")
+    resample = PREVIEW_RESAMPLE if scale < 1 else Image.LANCZOS
+    source = SOURCES.load(image_input, width, height, profiler=profiler, resample=resample)
+    base = source.image
 
+    mark = profile_start(profiler)
     draw = ImageDraw.Draw(base)
-    banner = Image.new("RGBA", (TARGET_W, int(banner_height)), primary_color)
+    banner = Image.new("RGBA", (width, int(banner_height)), primary_color)
     base.alpha_composite(banner, (0, 0))
+    profile_end(profiler, mark, "layer", area=width * int(banner_height), name="banner", type="panel")
 
-    title_text = wrap_text(draw, main_title, title_font, TARGET_W - 80)
-    tw, th = draw.textbbox((0, 0), title_text, font=title_font)[2:]
-    title_x = (TARGET_W - tw) // 2
-    title_y = max(12, int((banner_height - th) / 2))
-    draw_outlined_text(draw, (title_x, title_y), title_text, title_font, stroke=8, align="center")
+    mark = profile_start(profiler)
+    if payload.get("title_fit"):
+        # Shrink the title until it fits inside the banner instead of overflowing it.
+        fitted = fit_text(
+            " ".join(main_title.split()),
+            lambda size: load_font(size, family=font_family, style=font_style),
+            max_width=width - px(80),
+            max_height=banner_height - 2 * px(12),
+            max_lines=int(payload.get("title_max_lines") or 2),
+            min_size=px(24),
+            max_size=title_size,
+            spacing=px(4),
+            stroke_width=px(8),
+        )
+        title_font, title_text = fitted.font, fitted.text
+    else:
+        title_text = wrap_text(draw, main_title, title_font, width - px(80))
+    tw, th = draw.textbbox((0, 0), title_text, font=title_font, spacing=px(4))[2:]
+    title_x = (width - tw) // 2
+    title_y = max(px(12), int((banner_height - th) / 2))
+    draw_outlined_text(draw, (title_x, title_y), title_text, title_font, stroke=px(8), align="center", spacing=px(4))
+    profile_end(profiler, mark, "layer", area=tw * th, name="main_title", type="text")
 
     panel_h = int(panel_height)
-    panel_w = int((TARGET_W - (2 * panel_margin) - panel_gap) / 2)
-    panel_y = TARGET_H - panel_h - panel_margin
+    panel_w = int((width - (2 * panel_margin) - panel_gap) / 2)
+    panel_y = height - panel_h - panel_margin
     left_x = panel_margin
     right_x = left_x + panel_w + panel_gap
 
-    def add_panel(x, y, w, h):
-        panel = Image.new("RGBA", (w, h), (0, 0, 0, 155))
-        shadow = panel.filter(ImageFilter.GaussianBlur(6))
-        base.alpha_composite(shadow, (x + 6, y + 6))
-        base.alpha_composite(panel, (x, y))
+    # Hard-edged shadows and divider unless the payload opts into the Gaussian falloff.
+    soft = bool(payload.get("soft_shadows"))
+
+    def add_panel(name, x, y, w, h):
+        mark = profile_start(profiler)
+        shadow, (dx, dy) = soft_rect(w, h, (0, 0, 0, 155), 6 * scale if soft else 0)
+        area = composite_tile(base, shadow, (x + px(6) + dx, y + px(6) + dy))
+        area += composite_tile(base, solid_rect(w, h, (0, 0, 0, 155)), (x, y))
+        profile_end(profiler, mark, "layer", area=area, name=name, type="panel")
+
+    add_panel("left_panel", left_x, panel_y, panel_w, panel_h)
+    add_panel("right_panel", right_x, panel_y, panel_w, panel_h)
 
-    add_panel(left_x, panel_y, panel_w, panel_h)
-    add_panel(right_x, panel_y, panel_w, panel_h)
+    for name, caption, x in (("left_caption", left_caption, left_x), ("right_caption", right_caption, right_x)):
+        mark = profile_start(profiler)
+        text = wrap_text(draw, caption, sub_font, panel_w - (panel_padding * 2))
+        draw_outlined_text(draw, (x + panel_padding, panel_y + panel_padding), text, sub_font, stroke=px(7), spacing=px(4))
+        profile_end(profiler, mark, "layer", area=panel_w * panel_h, name=name, type="text")
 
-    left_text = wrap_text(draw, left_caption, sub_font, panel_w - (panel_padding * 2))
-    right_text = wrap_text(draw, right_caption, sub_font, panel_w - (panel_padding * 2))
+    mark = profile_start(profiler)
+    divider, dx = soft_divider(int(divider_width), height, (255, 255, 255, int(divider_opacity)), 2 * scale if soft else 0)
+    area = composite_tile(base, divider, (width // 2 - int(divider_width / 2) + dx, 0))
+    profile_end(profiler, mark, "layer", area=area, name="divider", type="divider")
 
-    draw_outlined_text(draw, (left_x + panel_padding, panel_y + panel_padding), left_text, sub_font, stroke=7)
-    draw_outlined_text(draw, (right_x + panel_padding, panel_y + panel_padding), right_text, sub_font, stroke=7)
+    mark = profile_start(profiler)
+    quality = PREVIEW_QUALITY if scale < 1 else OUTPUT_FORMAT["quality"]
+    spec = OutputSpec(output_path, format="JPEG", quality=quality)
+    output = encode(base, spec)
+    profile_end(profiler, mark, "save", area=width * height, name=spec.label)
 
-    divider = Image.new("RGBA", (int(divider_width), TARGET_H), (255, 255, 255, int(divider_opacity)))
-    divider = divider.filter(ImageFilter.GaussianBlur(2))
-    base.alpha_composite(divider, (TARGET_W // 2 - int(divider_width / 2), 0))
+    if output_path is None:
+        return {"data": output["data"], **source.describe()}
+    return {"output_path": str(output_path), **source.describe()}
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    base.convert("RGB").save(output_path, quality=95)
 
-    print(json.dumps({"output_path": str(output_path)}))
+def read_jobs(stdin):
+    # Newline-delimited JSON jobs. A job with "image_bytes": N is followed by exactly N raw bytes,
+    # the encoded source image, so uploads never need a file.
+    for line in iter(stdin.readline, b""):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield ValueError(f"Invalid job JSON: {exc}"), None
+            continue
+        size = payload.get("image_bytes") if isinstance(payload, dict) else None
+        if size is None:
+            yield payload, None
+            continue
+        if not isinstance(size, int) or size < 0:
+            # The rest of the stream cannot be framed any more.
+            yield ValueError(f"Invalid image_bytes: {size!r}"), None
+            return
+        image = stdin.read(size)
+        if len(image) != size:
+            yield ValueError(f"Input ended after {len(image)} of {size} image bytes"), None
+            return
+        yield payload, image
+
+
+def handle_job(payload, image=None):
+    if isinstance(payload, Exception):
+        return {"error": str(payload)}
+    job_id = payload.get("id") if isinstance(payload, dict) else None
+    try:
+        result = generate(payload, image)
+    except Exception as exc:
+        result = {"error": str(exc) or exc.__class__.__name__}
+    if job_id is not None:
+        result["id"] = job_id
+    return result
+
+
+def write_result(stdout, result):
+    # An image rendered in memory follows its result line as "output_bytes" raw bytes.
+    data = result.pop("data", None)
+    if data is not None:
+        result["output_bytes"] = len(data)
+    stdout.write((json.dumps(result) + "\n").encode("utf-8"))
+    if data is not None:
+        stdout.write(data)
+    stdout.flush()
+
+
+def serve(workers, queue_size, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    jobs = queue.Queue(maxsize=queue_size)
+    write_lock = threading.Lock()
+
+    def worker():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            result = handle_job(*job)
+            with write_lock:
+                write_result(stdout, result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    for job in read_jobs(stdin):
+        jobs.put(job)
+
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a split-screen thumbnail from a JSON payload on stdin.")
+    parser.add_argument("--serve", action="store_true", help="Read newline-delimited JSON jobs until stdin closes")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("THUMBNAIL_WORKERS", 0)) or os.cpu_count() or 1,
+        help="Worker threads in --serve mode",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=int(os.environ.get("THUMBNAIL_QUEUE_SIZE", 0)) or 32,
+        help="Jobs buffered before stdin reads block in --serve mode",
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(max(1, args.workers), max(1, args.queue_size))
+        return
+
+    payload = json.loads(sys.stdin.read())
+    write_result(sys.stdout.buffer, generate(payload))
 
 
 if __name__ == "__main__":
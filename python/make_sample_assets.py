@@ -1,41 +1,126 @@
+import argparse
+import hashlib
+import json
+import random
 from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps
 
 ROOT = Path(__file__).resolve().parents[1]
 ASSETS = ROOT / "assets"
 OVERLAYS = ASSETS / "overlays"
 TEMPLATES = ASSETS / "templates"
+CORPUS_DIR = ROOT / "out" / "corpus"
+
+CORPUS_SIZES: Dict[str, Tuple[int, int]] = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+    "48mp": (8000, 6000),
+}
+CORPUS_KINDS = ("gradient", "noise", "texture")
+CORPUS_FORMATS = ("jpg", "png")
+OVERLAY_ALPHAS = (64, 128, 192, 255)
+
+WORDS = (
+    "same money new junk vram tax why upgrades got expensive budget build lag speed power clean "
+    "ui then now tutorial part review honest the real cost of every gpu this year before after "
+    "mistakes nobody talks about fastest cheapest worth it"
+).split()
+
+
+# Everything below is built from whole-buffer operations: seeded random bytes, Pillow
+# resamples, blends and merges. No per-pixel Python, so 48 MP sources take seconds.
+
+
+def random_plane(rng: random.Random, width: int, height: int) -> Image.Image:
+    return Image.frombytes("L", (width, height), rng.randbytes(width * height))
+
+
+def smooth_field(rng: random.Random, width: int, height: int, cells: int) -> Image.Image:
+    # Low-frequency noise: a few random cells bicubically upsampled to the full size.
+    cells_x = max(2, cells)
+    cells_y = max(2, round(cells * height / width))
+    return random_plane(rng, cells_x, cells_y).resize((width, height), Image.BICUBIC)
+
+
+def random_color(rng: random.Random) -> Tuple[int, int, int]:
+    return (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+
+
+def gradient_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    ramp = Image.linear_gradient("L").rotate(rng.uniform(0, 360), resample=Image.BILINEAR, expand=False)
+    ramp = ImageOps.autocontrast(ramp.crop((64, 64, 192, 192))).resize((width, height), Image.BILINEAR)
+    return ImageOps.colorize(ramp, random_color(rng), random_color(rng))
+
+
+def noise_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    # Worst case for every codec: independent full-resolution noise per channel.
+    return Image.merge("RGB", [random_plane(rng, width, height) for _ in range(3)])
+
+
+def texture_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    # Photo-like: smooth colour regions, mid-frequency detail, soft shapes and sensor grain.
+    base = ImageOps.colorize(smooth_field(rng, width, height, 6), random_color(rng), random_color(rng))
+    detail = Image.merge("RGB", [smooth_field(rng, width, height, 96) for _ in range(3)])
+    image = Image.blend(base, detail, 0.25)
+
+    shapes = Image.new("RGBA", (max(width // 8, 1), max(height // 8, 1)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(shapes)
+    for _ in range(rng.randint(8, 24)):
+        x, y = rng.randrange(shapes.width), rng.randrange(shapes.height)
+        radius = rng.randint(2, max(shapes.width // 5, 3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=random_color(rng) + (rng.randint(60, 200),))
+    shapes = shapes.filter(ImageFilter.GaussianBlur(2)).resize((width, height), Image.BICUBIC)
+    image = Image.alpha_composite(image.convert("RGBA"), shapes).convert("RGB")
+
+    grain = random_plane(rng, width, height)
+    return Image.blend(image, Image.merge("RGB", (grain, grain, grain)), 0.06)
+
+
+GENERATORS = {"gradient": gradient_image, "noise": noise_image, "texture": texture_image}
+
+
+def save_source(image: Image.Image, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".png":
+        image.save(path, compress_level=1)
+    else:
+        image.save(path, quality=90)
+
+
+def make_source(path: Path, width: int, height: int, kind: str = "texture", seed: int = 0) -> None:
+    save_source(GENERATORS[kind](random.Random(seed), width, height), path)
 
 
 def make_base_image(path: Path) -> None:
-    base = Image.new("RGB", (1920, 1080))
-    for y in range(base.height):
-        r = int(20 + (120 * y / base.height))
-        g = int(80 + (80 * y / base.height))
-        b = int(140 + (80 * y / base.height))
-        for x in range(base.width):
-            base.putpixel((x, y), (r, g, b))
-
-    overlay = Image.new("RGB", (base.width // 2, base.height), (30, 30, 30))
-    base.paste(overlay, (0, 0))
+    # A vertical gradient with the left half darkened: one colour per row, stretched across.
+    width, height = 1920, 1080
+    rows = bytearray()
+    for y in range(height):
+        rows += bytes((int(20 + (120 * y / height)), int(80 + (80 * y / height)), int(140 + (80 * y / height))))
+    base = Image.frombytes("RGB", (1, height), bytes(rows)).resize((width, height), Image.NEAREST)
+    base.paste((30, 30, 30), (0, 0, width // 2, height))
     path.parent.mkdir(parents=True, exist_ok=True)
     base.save(path, quality=92)
 
 
-def make_arrow(path: Path) -> None:
+def make_arrow(path: Path, alpha: int = 230) -> None:
     arrow = Image.new("RGBA", (300, 160), (0, 0, 0, 0))
     draw = ImageDraw.Draw(arrow)
     points = [(0, 80), (200, 80), (200, 30), (300, 80), (200, 130), (200, 80)]
-    draw.polygon(points, fill=(255, 60, 60, 230))
+    draw.polygon(points, fill=(255, 60, 60, alpha))
     path.parent.mkdir(parents=True, exist_ok=True)
     arrow.save(path)
 
 
-def make_logo(path: Path) -> None:
+def make_logo(path: Path, alpha: int = 230) -> None:
     logo = Image.new("RGBA", (240, 240), (0, 0, 0, 0))
     draw = ImageDraw.Draw(logo)
-    draw.ellipse((10, 10, 230, 230), fill=(20, 200, 255, 230))
+    draw.ellipse((10, 10, 230, 230), fill=(20, 200, 255, alpha))
     inner = Image.new("RGBA", (140, 140), (0, 0, 0, 0))
     draw_inner = ImageDraw.Draw(inner)
     draw_inner.ellipse((0, 0, 140, 140), fill=(0, 40, 80, 255))
@@ -44,11 +129,137 @@ def make_logo(path: Path) -> None:
     logo.save(path)
 
 
+def make_glow(path: Path, seed: int, size: int = 320) -> None:
+    # Soft radial alpha with a random tint: exercises partial alpha everywhere, not just at edges.
+    rng = random.Random(seed)
+    alpha = ImageOps.invert(Image.radial_gradient("L")).resize((size, size), Image.BICUBIC)
+    glow = Image.new("RGBA", (size, size), random_color(rng) + (0,))
+    glow.putalpha(ImageChops.multiply(alpha, smooth_field(rng, size, size, 4).point(lambda v: 128 + v // 2)))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    glow.save(path)
+
+
+def caption(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).upper()
+
+
+def make_vars(template_path: Path, rng: random.Random) -> Dict[str, str]:
+    template = json.loads(template_path.read_text())
+    names = set()
+    for layer in template.get("layers", []):
+        text = str(layer.get("text", ""))
+        names.update(part.split("}}")[0].strip() for part in text.split("{{")[1:])
+    return {name: caption(rng, 1, 8) for name in sorted(names)}
+
+
+def item_seed(seed: int, *parts: Any) -> int:
+    # Hashed rather than drawn from a shared stream, so a file's pixels don't depend on which subset built it.
+    return int.from_bytes(hashlib.sha256(repr((seed,) + parts).encode()).digest()[:4], "big")
+
+
+def make_corpus(
+    directory: Path = CORPUS_DIR,
+    seed: int = 0,
+    sizes: Sequence[str] = tuple(CORPUS_SIZES),
+    kinds: Sequence[str] = CORPUS_KINDS,
+    formats: Sequence[str] = CORPUS_FORMATS,
+    vars_per_template: int = 4,
+) -> Dict[str, Any]:
+    # Deterministic for a given seed. Sources carry the seed in their name, so existing ones are reused.
+    rng = random.Random(seed)
+    manifest: Dict[str, Any] = {"seed": seed, "sources": [], "overlays": [], "vars": []}
+
+    for size_label in sizes:
+        width, height = CORPUS_SIZES[size_label]
+        for kind in kinds:
+            paths = [directory / "sources" / f"{kind}_{size_label}_s{seed}.{fmt}" for fmt in formats]
+            missing = [path for path in paths if not path.exists()]
+            if missing:
+                # Generate once, encode every missing format from the same pixels.
+                image = GENERATORS[kind](random.Random(item_seed(seed, kind, size_label)), width, height)
+                for path in missing:
+                    save_source(image, path)
+                del image
+            for fmt, path in zip(formats, paths):
+                manifest["sources"].append(
+                    {"path": str(path), "kind": kind, "size": size_label, "width": width, "height": height, "format": fmt}
+                )
+
+    for alpha in OVERLAY_ALPHAS:
+        for name, make in (("arrow", make_arrow), ("logo", make_logo)):
+            path = directory / "overlays" / f"{name}_a{alpha}.png"
+            make(path, alpha=alpha)
+            manifest["overlays"].append({"path": str(path), "alpha": alpha})
+    for index in range(2):
+        path = directory / "overlays" / f"glow_{index}.png"
+        make_glow(path, seed=item_seed(seed, "glow", index))
+        manifest["overlays"].append({"path": str(path), "alpha": "radial"})
+
+    jobs: List[Dict[str, Any]] = []
+    for template_path in sorted(TEMPLATES.glob("*.json")):
+        if template_path.name.startswith("vars_"):
+            continue
+        for index in range(vars_per_template):
+            vars_path = directory / "vars" / f"vars_{template_path.stem}_{index}.json"
+            vars_path.parent.mkdir(parents=True, exist_ok=True)
+            vars_path.write_text(json.dumps(make_vars(template_path, rng), indent=2))
+            manifest["vars"].append({"path": str(vars_path), "template": str(template_path)})
+            for source in manifest["sources"]:
+                job_id = f"{template_path.stem}_{index}_{source['kind']}_{source['size']}_{source['format']}"
+                jobs.append(
+                    {
+                        "id": job_id,
+                        "input": source["path"],
+                        "template": str(template_path),
+                        "vars": str(vars_path),
+                        "out": str(directory / "renders" / f"{job_id}.jpg"),
+                    }
+                )
+
+    # Ready-made input for `python -m python.parallel_batch --jobs`.
+    (directory / "jobs.jsonl").write_text("".join(json.dumps(job) + "\n" for job in jobs))
+    manifest["jobs"] = str(directory / "jobs.jsonl")
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
 def main() -> None:
     make_base_image(TEMPLATES / "sample_base.jpg")
     make_arrow(OVERLAYS / "arrow_red.png")
     make_logo(OVERLAYS / "logo_blue.png")
 
 
-if __name__ == "__main__":
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Generate the sample assets and, optionally, a synthetic test corpus.")
+    parser.add_argument("--corpus", nargs="?", const=str(CORPUS_DIR), help="Also build a corpus in this directory")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed; the same seed gives the same files")
+    parser.add_argument("--sizes", type=split_list, default=list(CORPUS_SIZES), help=f"Any of {', '.join(CORPUS_SIZES)}")
+    parser.add_argument("--kinds", type=split_list, default=list(CORPUS_KINDS), help=f"Any of {', '.join(CORPUS_KINDS)}")
+    parser.add_argument("--formats", type=split_list, default=list(CORPUS_FORMATS), help="jpg and/or png")
+    parser.add_argument("--vars-per-template", type=int, default=4, help="Vars files generated per bundled template")
+    args = parser.parse_args()
+
     main()
+    if args.corpus:
+        unknown = [size for size in args.sizes if size not in CORPUS_SIZES] + [
+            kind for kind in args.kinds if kind not in GENERATORS
+        ]
+        if unknown:
+            parser.error(f"unknown sizes or kinds: {', '.join(unknown)}")
+        manifest = make_corpus(
+            Path(args.corpus),
+            seed=args.seed,
+            sizes=args.sizes,
+            kinds=args.kinds,
+            formats=args.formats,
+            vars_per_template=args.vars_per_template,
+        )
+        print(f"Wrote {len(manifest['sources'])} sources, {len(manifest['overlays'])} overlays and {len(manifest['vars'])} vars files to {args.corpus}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,275 @@
+import io
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from python.source_image import cover_resize
+
+
+FORMATS_BY_SUFFIX = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+SUFFIX_BY_FORMAT = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+DEFAULT_QUALITY = {"JPEG": 95, "WEBP": 90}
+
+
+class OutputSpecError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class OutputSpec:
+    # Without a path the encoded bytes are written to stream, or returned as "data" in the
+    # encode result when there is no stream either; the format must then be given.
+    path: Optional[Path]
+    format: Optional[str] = None
+    size: Optional[Tuple[int, int]] = None
+    quality: Optional[int] = None
+    progressive: bool = False
+    optimize: bool = False
+    method: Optional[int] = None
+    compress_level: Optional[int] = None
+    stream: Optional[BinaryIO] = field(default=None, compare=False, repr=False)
+
+    @property
+    def resolved_format(self) -> str:
+        if self.format:
+            return self.format.upper().replace("JPG", "JPEG")
+        if self.path is None:
+            raise OutputSpecError("Outputs without a path need a format")
+        fmt = FORMATS_BY_SUFFIX.get(self.path.suffix.lower())
+        if fmt is None:
+            raise OutputSpecError(f"Cannot infer output format from '{self.path}'")
+        return fmt
+
+    @property
+    def suffix(self) -> str:
+        if self.path is not None and self.path.suffix:
+            return self.path.suffix.lower()
+        return SUFFIX_BY_FORMAT.get(self.resolved_format, "")
+
+    @property
+    def label(self) -> str:
+        if self.path is not None:
+            return self.path.name
+        return f"<{self.resolved_format.lower()} {'stream' if self.stream is not None else 'bytes'}>"
+
+    def cache_format(self) -> Dict[str, Any]:
+        return {
+            "format": self.resolved_format,
+            "size": list(self.size) if self.size else None,
+            "quality": self.quality,
+            "progressive": self.progressive,
+            "optimize": self.optimize,
+            "method": self.method,
+            "compress_level": self.compress_level,
+        }
+
+    def save_options(self) -> Dict[str, Any]:
+        fmt = self.resolved_format
+        options: Dict[str, Any] = {"format": fmt}
+        if fmt in DEFAULT_QUALITY:
+            options["quality"] = self.quality if self.quality is not None else DEFAULT_QUALITY[fmt]
+        if fmt == "JPEG":
+            options["progressive"] = self.progressive
+            options["optimize"] = self.optimize
+        elif fmt == "PNG":
+            options["optimize"] = self.optimize
+            if self.compress_level is not None:
+                options["compress_level"] = self.compress_level
+        elif fmt == "WEBP" and self.method is not None:
+            options["method"] = self.method
+        return options
+
+    @classmethod
+    def parse(cls, text: str) -> "OutputSpec":
+        # "out/thumb.webp,size=320x180,quality=80,method=6,progressive,optimize" or "out/thumb.png,compress_level=1"
+        path, *options = [part.strip() for part in text.split(",")]
+        if not path:
+            raise OutputSpecError(f"Output spec missing path: '{text}'")
+        values: Dict[str, Any] = {}
+        for option in options:
+            name, _, value = option.partition("=")
+            if name not in {"size", "quality", "method", "compress_level", "format", "progressive", "optimize"}:
+                raise OutputSpecError(f"Unknown output option '{name}' in '{text}'")
+            try:
+                if name == "size":
+                    width, height = value.lower().split("x")
+                    values["size"] = (int(width), int(height))
+                elif name in {"quality", "method", "compress_level"}:
+                    values[name] = int(value)
+                elif name == "format":
+                    values["format"] = value
+                else:
+                    values[name] = value.lower() not in {"0", "false", "no"} if value else True
+            except ValueError as exc:
+                raise OutputSpecError(f"Invalid value for '{name}' in '{text}'") from exc
+        return cls(path=Path(path), **values)
+
+
+def build_pyramid(image: Image.Image, sizes: Sequence[Tuple[int, int]]) -> Dict[Tuple[int, int], Image.Image]:
+    levels = {image.size: image}
+    for size in sorted(set(sizes), key=lambda item: item[0] * item[1], reverse=True):
+        if size in levels:
+            continue
+        # Resample from the smallest level that still covers the target in both dimensions.
+        parent = min(
+            (level for dims, level in levels.items() if dims[0] >= size[0] and dims[1] >= size[1]),
+            key=lambda level: level.width * level.height,
+            default=image,
+        )
+        levels[size] = cover_resize(parent, size[0], size[1])
+    return levels
+
+
+def encode(image: Image.Image, spec: OutputSpec) -> Dict[str, Any]:
+    started = time.perf_counter()
+    options = spec.save_options()
+    if options["format"] == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, **options)
+    result = {
+        "path": str(spec.path) if spec.path is not None else None,
+        "format": options["format"],
+        "size": list(image.size),
+        "bytes": buffer.getbuffer().nbytes,
+    }
+    if spec.stream is not None:
+        spec.stream.write(buffer.getbuffer())
+    elif spec.path is None:
+        # No export of the buffer is alive here, so getvalue() hands over its bytes without a copy.
+        result["data"] = buffer.getvalue()
+    else:
+        spec.path.parent.mkdir(parents=True, exist_ok=True)
+        with spec.path.open("wb") as handle:
+            handle.write(buffer.getbuffer())
+    result["encode_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def encode_outputs(image: Image.Image, specs: Sequence[OutputSpec], threads: int = 0) -> List[Dict[str, Any]]:
+    levels = build_pyramid(image, [spec.size for spec in specs if spec.size])
+    jobs = [(levels[spec.size] if spec.size else image, spec) for spec in specs]
+    if threads > 1 and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=min(threads, len(jobs))) as pool:
+            return list(pool.map(lambda job: encode(*job), jobs))
+    return [encode(level, spec) for level, spec in jobs]
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def png_idat(data: memoryview) -> Iterator[memoryview]:
+    position = 8
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position : position + 8])
+        if kind == b"IDAT":
+            yield data[position + 8 : position + 8 + length]
+        position += 12 + length
+
+
+def png_scanlines(band: Image.Image) -> Iterator[bytes]:
+    # Let Pillow pick its per-row filters on a stored (uncompressed) PNG of the band, then unwrap
+    # them piece by piece so no second copy of the band is built.
+    buffer = io.BytesIO()
+    band.save(buffer, format="PNG", compress_level=0)
+    inflate = zlib.decompressobj()
+    row_bytes = 1 + band.width * len(band.getbands())
+    head = b""
+    for chunk in png_idat(buffer.getbuffer()):
+        data = inflate.decompress(chunk)
+        if len(head) < row_bytes:
+            head += data
+            if len(head) < row_bytes:
+                continue
+            data, head = head[row_bytes:], head[:row_bytes]
+            if head[0] not in {0, 1}:
+                # The first row was filtered against an empty row; in the full image it follows the previous band.
+                head = b"\x00" + band.crop((0, 0, band.width, 1)).tobytes()
+            yield head
+        yield data
+    yield inflate.flush()
+
+
+class BandEncoder:
+    # Takes a canvas top to bottom, one band at a time. PNG is compressed as the bands arrive;
+    # JPEG and WebP encoders need the whole picture, so bands are pasted into the one image they read.
+    def __init__(self, spec: OutputSpec, size: Tuple[int, int], mode: str = "RGBA") -> None:
+        if spec.size and tuple(spec.size) != tuple(size):
+            raise OutputSpecError(f"Banded rendering cannot resize outputs: '{spec.label}'")
+        self.spec = spec
+        self.size = size
+        self.options = spec.save_options()
+        self.elapsed = 0.0
+        self.rows = 0
+        self.written = 0
+        self.handle: Optional[BinaryIO] = None
+        self.image: Optional[Image.Image] = None
+        self.compressor = None
+        started = time.perf_counter()
+        if self.options["format"] == "PNG":
+            level = 9 if spec.optimize else spec.compress_level if spec.compress_level is not None else -1
+            self.compressor = zlib.compressobj(level)
+            if spec.stream is not None:
+                self.handle = spec.stream
+            elif spec.path is None:
+                self.handle = io.BytesIO()
+            else:
+                spec.path.parent.mkdir(parents=True, exist_ok=True)
+                self.handle = spec.path.open("wb")
+            color_type = {"RGBA": 6, "RGB": 2}[mode]
+            self._write(b"\x89PNG\r\n\x1a\n")
+            self._write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, color_type, 0, 0, 0)))
+        else:
+            self.image = Image.new("RGB" if self.options["format"] == "JPEG" else mode, size)
+        self.elapsed += time.perf_counter() - started
+
+    def _write(self, data: bytes) -> None:
+        self.handle.write(data)
+        self.written += len(data)
+
+    def write(self, band: Image.Image) -> None:
+        started = time.perf_counter()
+        if self.compressor is not None:
+            for scanlines in png_scanlines(band):
+                data = self.compressor.compress(scanlines)
+                if data:
+                    self._write(png_chunk(b"IDAT", data))
+        else:
+            self.image.paste(band if band.mode == self.image.mode else band.convert(self.image.mode), (0, self.rows))
+        self.rows += band.height
+        self.elapsed += time.perf_counter() - started
+
+    def discard(self) -> None:
+        self.image = None
+        if self.handle is not None and self.handle is not self.spec.stream:
+            self.handle.close()
+
+    def close(self) -> Dict[str, Any]:
+        if self.compressor is None:
+            result = encode(self.image, self.spec)
+            self.image = None
+            result["encode_ms"] = round(result["encode_ms"] + self.elapsed * 1000, 2)
+            return result
+        started = time.perf_counter()
+        self._write(png_chunk(b"IDAT", self.compressor.flush()))
+        self._write(png_chunk(b"IEND", b""))
+        result: Dict[str, Any] = {
+            "path": str(self.spec.path) if self.spec.path is not None else None,
+            "format": "PNG",
+            "size": list(self.size),
+            "bytes": self.written,
+        }
+        if self.spec.stream is None and self.spec.path is None:
+            result["data"] = self.handle.getvalue()
+        elif self.spec.stream is None:
+            self.handle.close()
+        self.elapsed += time.perf_counter() - started
+        result["encode_ms"] = round(self.elapsed * 1000, 2)
+        return result
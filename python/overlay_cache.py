@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from python.cache import LRUCache
+
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get("THUMBNAIL_OVERLAY_CACHE_MB", 64)) * 1024 * 1024
+
+
+def opacity_lut(opacity: float) -> List[int]:
+    return [int(value * opacity) for value in range(256)]
+
+
+def image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class OverlayCache:
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET_BYTES) -> None:
+        self._images = LRUCache(max_bytes=max_bytes, sizeof=image_bytes)
+
+    def get(
+        self,
+        path: Union[str, Path],
+        size: Optional[Tuple[int, int]] = None,
+        opacity: float = 1.0,
+    ) -> Image.Image:
+        path = Path(path)
+        key = (str(path), path.stat().st_mtime_ns, size, opacity)
+        return self._images.get_or_create(key, lambda: self._prepare(path, size, opacity))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._images.stats()
+
+    def clear(self) -> None:
+        self._images.clear()
+
+    @staticmethod
+    def _prepare(path: Path, size: Optional[Tuple[int, int]], opacity: float) -> Image.Image:
+        with Image.open(path) as source:
+            overlay = source.convert("RGBA")
+        if size:
+            overlay = overlay.resize(size, Image.LANCZOS)
+        if opacity < 1.0:
+            overlay.putalpha(overlay.getchannel("A").point(opacity_lut(opacity)))
+        return overlay
+
+
+OVERLAYS = OverlayCache()
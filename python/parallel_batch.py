@@ -0,0 +1,368 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from python.render_thumbnail import (
+    TemplateError,
+    compose_compiled,
+    load_compiled_template,
+    load_source,
+    read_json,
+    save_image,
+)
+
+
+@dataclass
+class BatchJob:
+    index: int
+    input_path: str
+    template_path: str
+    output_path: str
+    variables: Optional[Dict[str, Any]] = None
+    vars_path: Optional[str] = None
+    job_id: Any = None
+
+
+@dataclass
+class SharedSource:
+    shm: shared_memory.SharedMemory
+    size: Tuple[int, int]
+    jobs: List[int]
+    remaining: int
+    info: Dict[str, Any] = field(default_factory=dict)
+
+    def release(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# Tasks sent to workers: (kind, key, job, shared) where shared is (shm name, width, height) or None.
+Task = Tuple[str, Any, Optional[BatchJob], Optional[Tuple[str, int, int]]]
+
+
+def read_jobs(path: Path) -> List[BatchJob]:
+    jobs = []
+    with path.open() as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                variables = row.get("vars")
+                jobs.append(
+                    BatchJob(
+                        index=len(jobs),
+                        input_path=row["input"],
+                        template_path=row["template"],
+                        output_path=row["out"],
+                        variables=variables if isinstance(variables, dict) else None,
+                        vars_path=variables if isinstance(variables, str) else None,
+                        job_id=row.get("id"),
+                    )
+                )
+            except (json.JSONDecodeError, KeyError, AttributeError) as exc:
+                raise TemplateError(f"Invalid job on line {line_number} of {path}: {exc}") from exc
+    return jobs
+
+
+def open_shared(name: str) -> shared_memory.SharedMemory:
+    # The parent creates and unlinks every segment. Before Python 3.13 attaching also registers the
+    # name, which is harmless because workers share the parent's resource tracker (see run()).
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_source(shared: Tuple[str, int, int]) -> Image.Image:
+    name, width, height = shared
+    shm = open_shared(name)
+    try:
+        return Image.frombuffer("RGBA", (width, height), shm.buf, "raw", "RGBA", 0, 1).copy()
+    finally:
+        shm.close()
+
+
+def prepare_shared(job: BatchJob, shared: Tuple[str, int, int]) -> Dict[str, Any]:
+    compiled = load_compiled_template(Path(job.template_path))
+    # Shared sources are decoded once into shared memory already; keeping a private copy would only cost memory.
+    source = load_source(Path(job.input_path), compiled.template, compiled.canvas, sources=None)
+    shm = open_shared(shared[0])
+    try:
+        data = source.image.tobytes()
+        shm.buf[: len(data)] = data
+    finally:
+        shm.close()
+    return source.describe()
+
+
+def render_job(job: BatchJob, shared: Optional[Tuple[str, int, int]]) -> Dict[str, Any]:
+    compiled = load_compiled_template(Path(job.template_path))
+    variables = job.variables if job.variables is not None else read_json(Path(job.vars_path or ""))
+    if shared is not None:
+        base = attach_source(shared)
+    else:
+        base = load_source(Path(job.input_path), compiled.template, compiled.canvas, sources=None).image
+    save_image(compose_compiled(base, compiled, variables), Path(job.output_path))
+    return {"output_path": job.output_path}
+
+
+def worker_main(conn: Connection) -> None:
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        kind, key, job, shared = task
+        started = time.perf_counter()
+        try:
+            value = prepare_shared(job, shared) if kind == "prepare" else render_job(job, shared)
+            ok = True
+        except Exception as exc:
+            value = {"error": str(exc) or exc.__class__.__name__}
+            ok = False
+        value["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        conn.send((kind, key, ok, value))
+
+
+class Worker:
+    def __init__(self, context: Any) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task: Optional[Task] = None
+        self.started = 0.0
+
+    def send(self, task: Task) -> None:
+        self.task = task
+        self.started = time.monotonic()
+        self.conn.send(task)
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ParallelRenderer:
+    def __init__(
+        self,
+        workers: int = 0,
+        timeout: Optional[float] = None,
+        retries: int = 1,
+        max_shared: int = 0,
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+        self.max_shared = max_shared or self.workers * 2
+        self.summary: Dict[str, Any] = {}
+
+    def run(self, jobs: List[BatchJob], ordered: bool = True) -> Iterator[Dict[str, Any]]:
+        context = multiprocessing.get_context()
+        groups: "OrderedDict[Tuple[str, int, int, str], List[int]]" = OrderedDict()
+        results: Dict[int, Dict[str, Any]] = {}
+        for job in jobs:
+            try:
+                # Compiled here too, without plates: a template with a missing font or overlay
+                # fails before any worker decodes its source.
+                compiled = load_compiled_template(Path(job.template_path), flatten=False)
+            except TemplateError as exc:
+                results[job.index] = {"error": str(exc)}
+                continue
+            crop = json.dumps(compiled.template.get("crop", {}), sort_keys=True)
+            key = (str(Path(job.input_path).resolve()), compiled.canvas.width, compiled.canvas.height, crop)
+            groups.setdefault(key, []).append(job.index)
+
+        waiting: Deque[Tuple[Any, List[int]]] = deque(groups.items())
+        ready: Deque[Task] = deque()
+        shared: Dict[Any, SharedSource] = {}
+        attempts: Dict[Tuple[str, Any], int] = {}
+        # Start the tracker before forking so workers report to it instead of starting their own.
+        resource_tracker.ensure_running()
+        pool = [Worker(context) for _ in range(self.workers)]
+        next_index = 0
+        retried = 0
+        started = time.perf_counter()
+
+        def fill() -> None:
+            while waiting and len(ready) < self.workers:
+                key, indices = waiting[0]
+                if len(indices) > 1 and len(shared) >= self.max_shared:
+                    return
+                waiting.popleft()
+                if len(indices) == 1:
+                    ready.append(("render", indices[0], jobs[indices[0]], None))
+                    continue
+                width, height = key[1], key[2]
+                shm = shared_memory.SharedMemory(create=True, size=width * height * 4)
+                shared[key] = SharedSource(shm=shm, size=(width, height), jobs=indices, remaining=len(indices))
+                ready.append(("prepare", key, jobs[indices[0]], (shm.name, width, height)))
+
+        def finish_render(task: Task, value: Dict[str, Any], tries: int) -> None:
+            _kind, index, job, shared_spec = task
+            if job.job_id is not None:
+                value["id"] = job.job_id
+            value["attempts"] = tries
+            value["shared_source"] = shared_spec is not None
+            results[index] = value
+            if shared_spec is not None:
+                for key, source in list(shared.items()):
+                    if source.shm.name == shared_spec[0]:
+                        source.remaining -= 1
+                        if source.remaining == 0:
+                            source.release()
+                            del shared[key]
+                        break
+
+        def finish_prepare(task: Task, ok: bool, value: Dict[str, Any]) -> None:
+            key = task[1]
+            source = shared[key]
+            if ok:
+                source.info = value
+                spec = (source.shm.name, source.size[0], source.size[1])
+                ready.extendleft(("render", index, jobs[index], spec) for index in reversed(source.jobs))
+            else:
+                # Fall back to per-job decoding so each job reports its own error.
+                source.release()
+                del shared[key]
+                ready.extendleft(("render", index, jobs[index], None) for index in reversed(source.jobs))
+
+        def fail(task: Task, reason: str) -> None:
+            nonlocal retried
+            kind, key = task[0], task[1]
+            attempts[(kind, key)] = attempts.get((kind, key), 0) + 1
+            if reason == "crash" and attempts[(kind, key)] <= self.retries:
+                retried += 1
+                ready.appendleft(task)
+                return
+            message = "worker crashed" if reason == "crash" else f"timed out after {self.timeout}s"
+            if kind == "prepare":
+                finish_prepare(task, False, {"error": message})
+            else:
+                finish_render(task, {"error": message}, attempts[(kind, key)])
+
+        try:
+            while True:
+                fill()
+                for worker_index, worker in enumerate(pool):
+                    if worker.task is None and ready:
+                        try:
+                            worker.send(ready.popleft())
+                        except (BrokenPipeError, OSError):
+                            ready.appendleft(worker.task)
+                            worker.task = None
+                            worker.stop(kill=True)
+                            pool[worker_index] = Worker(context)
+
+                busy = [worker for worker in pool if worker.task is not None]
+                if not busy and not ready and not waiting:
+                    break
+
+                for conn in wait([worker.conn for worker in busy], timeout=0.05):
+                    worker = next(item for item in busy if item.conn is conn)
+                    task = worker.task
+                    try:
+                        kind, _key, ok, value = conn.recv()
+                    except (EOFError, OSError):
+                        continue
+                    worker.task = None
+                    if kind == "prepare":
+                        finish_prepare(task, ok, value)
+                    else:
+                        finish_render(task, value, attempts.get(("render", task[1]), 0) + 1)
+
+                now = time.monotonic()
+                for worker_index, worker in enumerate(pool):
+                    if worker.task is None:
+                        continue
+                    timed_out = self.timeout is not None and now - worker.started > self.timeout
+                    if not timed_out and worker.process.is_alive():
+                        continue
+                    task = worker.task
+                    worker.stop(kill=True)
+                    pool[worker_index] = Worker(context)
+                    fail(task, "timeout" if timed_out else "crash")
+
+                if ordered:
+                    while next_index in results:
+                        yield {"index": next_index, **results.pop(next_index)}
+                        next_index += 1
+                else:
+                    for index in sorted(results):
+                        yield {"index": index, **results.pop(index)}
+            for index in sorted(results):
+                yield {"index": index, **results.pop(index)}
+        finally:
+            for worker in pool:
+                worker.stop(kill=worker.task is not None)
+            for source in shared.values():
+                source.release()
+
+        elapsed = time.perf_counter() - started
+        rate = len(jobs) / elapsed if elapsed > 0 else 0.0
+        self.summary = {
+            "jobs": len(jobs),
+            "workers": self.workers,
+            "retries": retried,
+            "elapsed_s": round(elapsed, 3),
+            "renders_per_s": round(rate, 2),
+            "renders_per_s_per_core": round(rate / self.workers, 2),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render a JSONL list of thumbnail jobs on a process pool.")
+    parser.add_argument("--jobs", required=True, help='JSONL with {"input", "template", "vars", "out"} per line')
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, help="Seconds before a running job is killed")
+    parser.add_argument("--retries", type=int, default=1, help="Retries for jobs whose worker crashed")
+    parser.add_argument("--max-shared", type=int, default=0, help="Decoded sources kept in shared memory at once")
+    parser.add_argument("--unordered", action="store_true", help="Stream results as they finish")
+
+    args = parser.parse_args()
+    try:
+        jobs = read_jobs(Path(args.jobs))
+    except (OSError, TemplateError) as exc:
+        raise SystemExit(f"Error: {exc}") from exc
+
+    renderer = ParallelRenderer(
+        workers=args.workers,
+        timeout=args.timeout,
+        retries=args.retries,
+        max_shared=args.max_shared,
+    )
+    failed = 0
+    for result in renderer.run(jobs, ordered=not args.unordered):
+        failed += "error" in result
+        print(json.dumps(result), flush=True)
+    print(json.dumps({**renderer.summary, "failed": failed}), file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import copy
+import math
+from dataclasses import replace
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from python.outputs import OutputSpec
+
+# Draft renders trade resampling and encoder effort for latency; geometry stays exact.
+PREVIEW_RESAMPLE = Image.BILINEAR
+PREVIEW_QUALITY = 70
+PREVIEW_PNG_COMPRESS_LEVEL = 1
+PREVIEW_WEBP_METHOD = 0
+
+
+def scale_offset(value: Any, scale: float) -> int:
+    # Round half up rather than to even so neighbouring edges move together.
+    return math.floor(float(value) * scale + 0.5)
+
+
+def scale_length(value: Any, scale: float) -> int:
+    # Lengths that were positive stay at least one pixel so strokes, blurs and panels never vanish.
+    scaled = scale_offset(value, scale)
+    return max(1, scaled) if float(value) > 0 else scaled
+
+
+def scale_point(point: Optional[Dict[str, Any]], scale: float, keys=("x", "y")) -> Optional[Dict[str, Any]]:
+    if not isinstance(point, dict):
+        return point
+    return {**point, **{key: scale_offset(point[key], scale) for key in keys if key in point}}
+
+
+def scale_shadow(shadow: Optional[Dict[str, Any]], scale: float) -> Optional[Dict[str, Any]]:
+    if not shadow:
+        return shadow
+    scaled = dict(shadow)
+    if "blur" in scaled:
+        scaled["blur"] = scale_length(scaled["blur"], scale)
+    if "offset" in scaled:
+        scaled["offset"] = scale_point(scaled["offset"], scale)
+    return scaled
+
+
+def overlay_size(path: str) -> Optional[Dict[str, int]]:
+    try:
+        with Image.open(path) as image:
+            return {"width": image.width, "height": image.height}
+    except OSError:
+        # Leave it to the renderer to report the missing overlay.
+        return None
+
+
+def scale_layer(layer: Dict[str, Any], scale: float) -> Dict[str, Any]:
+    scaled = copy.deepcopy(layer)
+    layer_type = scaled.get("type")
+    if layer_type == "divider":
+        if "position" in scaled:
+            scaled["position"] = scale_offset(scaled["position"], scale)
+        scaled["width"] = scale_length(scaled.get("width", 4), scale)
+        if "blur" in scaled:
+            scaled["blur"] = scale_length(scaled["blur"], scale)
+        return scaled
+
+    if "position" in scaled:
+        scaled["position"] = scale_point(scaled["position"], scale)
+    if "padding" in scaled:
+        scaled["padding"] = scale_point(scaled["padding"], scale)
+    if "shadow" in scaled:
+        scaled["shadow"] = scale_shadow(scaled["shadow"], scale)
+    if layer_type == "overlay" and not scaled.get("size") and scaled.get("path"):
+        scaled["size"] = overlay_size(scaled["path"])
+    if scaled.get("size"):
+        size = scaled["size"]
+        scaled["size"] = {**size, **{key: scale_length(size[key], scale) for key in ("width", "height") if key in size}}
+    if layer_type == "text":
+        if scaled.get("font", {}).get("size"):
+            scaled["font"]["size"] = scale_length(scaled["font"]["size"], scale)
+        if scaled.get("stroke", {}).get("width"):
+            scaled["stroke"]["width"] = scale_length(scaled["stroke"]["width"], scale)
+        if "line_spacing" in scaled:
+            scaled["line_spacing"] = scale_offset(scaled["line_spacing"], scale)
+        if scaled.get("fit"):
+            fit = scaled["fit"]
+            for key in ("max_width", "max_height", "min_size", "max_size"):
+                if fit.get(key):
+                    fit[key] = scale_length(fit[key], scale)
+    return scaled
+
+
+def scale_template(template: Dict[str, Any], scale: float) -> Dict[str, Any]:
+    if scale == 1:
+        return template
+    canvas = template.get("canvas", {})
+    scaled = {key: value for key, value in template.items() if key not in {"canvas", "layers"}}
+    scaled["canvas"] = {**canvas, **{key: scale_length(canvas[key], scale) for key in ("width", "height") if key in canvas}}
+    scaled["layers"] = [scale_layer(layer, scale) for layer in template.get("layers", [])]
+    return scaled
+
+
+def preview_spec(spec: OutputSpec, scale: float) -> OutputSpec:
+    size = (scale_length(spec.size[0], scale), scale_length(spec.size[1], scale)) if spec.size else None
+    return replace(
+        spec,
+        size=size,
+        quality=PREVIEW_QUALITY,
+        progressive=False,
+        optimize=False,
+        method=PREVIEW_WEBP_METHOD,
+        compress_level=PREVIEW_PNG_COMPRESS_LEVEL,
+    )
@@ -0,0 +1,91 @@
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+Event = Dict[str, Any]
+# (perf_counter at start, traced bytes at start or -1 when no peak is taken, whether it counts as open)
+Mark = Tuple[float, int, bool]
+
+
+class RenderHook(Protocol):
+    # Events started and not yet ended while tracemalloc is on.
+    open_events: int
+
+    def record(self, event: Event) -> None:
+        ...
+
+
+class RenderProfiler:
+    def __init__(self) -> None:
+        self.events: List[Event] = []
+        self.open_events = 0
+
+    def record(self, event: Event) -> None:
+        self.events.append(event)
+
+    def stage_totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for event in self.events:
+            totals[event["stage"]] = round(totals.get(event["stage"], 0.0) + event["ms"], 3)
+        return totals
+
+    def timings(self) -> Dict[str, Any]:
+        layers = [
+            {key: value for key, value in event.items() if key != "stage"}
+            for event in self.events
+            if event["stage"] in {"layer", "compile"}
+        ]
+        return {
+            "total_ms": round(sum(event["ms"] for event in self.events), 3),
+            "stages": self.stage_totals(),
+            "layers": layers,
+        }
+
+    def table(self) -> str:
+        total = sum(event["ms"] for event in self.events) or 1.0
+        rows = [["stage", "name", "type", "ms", "%", "pixels", "alloc KB"]]
+        for event in self.events:
+            alloc = event.get("alloc_bytes")
+            rows.append(
+                [
+                    event["stage"],
+                    str(event.get("name") or ""),
+                    str(event.get("type") or ""),
+                    f"{event['ms']:.2f}",
+                    f"{100 * event['ms'] / total:.1f}",
+                    str(event.get("area") or ""),
+                    f"{alloc / 1024:.1f}" if alloc is not None else "",
+                ]
+            )
+        rows.append(["total", "", "", f"{sum(event['ms'] for event in self.events):.2f}", "100.0", "", ""])
+        widths = [max(len(row[index]) for row in rows) for index in range(len(rows[0]))]
+        return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
+
+
+def profile_start(profiler: Optional[RenderHook]) -> Optional[Mark]:
+    if profiler is None:
+        return None
+    traced = -1
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # The peak is process-wide, so only the outermost event resets and reports it; nested
+        # events would otherwise reset it under their parent.
+        if profiler.open_events == 0:
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        profiler.open_events += 1
+    return time.perf_counter(), traced, tracing
+
+
+def profile_end(profiler: Optional[RenderHook], mark: Optional[Mark], stage: str, area: int = 0, **info: Any) -> None:
+    if profiler is None or mark is None:
+        return
+    started, traced, opened = mark
+    if opened:
+        profiler.open_events -= 1
+    event: Event = {"stage": stage, "ms": round((time.perf_counter() - started) * 1000, 3), "area": area}
+    event.update((key, value) for key, value in info.items() if value is not None)
+    if traced >= 0 and tracemalloc.is_tracing():
+        # Python-heap peak only; Pillow allocates pixel buffers outside tracemalloc.
+        event["alloc_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - traced)
+    profiler.record(event)
@@ -0,0 +1,154 @@
+import math
+from typing import Optional, Sequence, Tuple
+
+from PIL import Image, ImageFilter
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only on Pillow-only installs
+    np = None
+
+
+Color = Tuple[int, int, int, int]
+ColorStop = Tuple[float, Color]
+Rows = Optional[Tuple[int, int]]
+
+# Float coverage built per chunk of rows before it is quantized to 8-bit alpha.
+COVERAGE_CHUNK_PIXELS = 1 << 20
+
+
+def shadow_margin(sigma: float) -> int:
+    # Beyond 3 sigma the Gaussian tail is below half a level of 8-bit alpha.
+    return int(math.ceil(3 * sigma)) + 1 if sigma > 0 else 0
+
+
+def solid_rect(width: int, height: int, color: Color) -> Image.Image:
+    return Image.new("RGBA", (width, height), color)
+
+
+def clip_rows(rows: Rows, start: int, end: int) -> Tuple[int, int]:
+    # rows limits a tile to a window (e.g. one band of the canvas); every row comes out as in the full tile.
+    if rows is None:
+        return start, end
+    first = max(rows[0], start)
+    return first, max(first, min(rows[1], end))
+
+
+def _erf(values: "np.ndarray") -> "np.ndarray":
+    # Abramowitz and Stegun 7.1.26: absolute error below 1.5e-7, far under half a level of 8-bit alpha.
+    x = np.abs(values)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return np.copysign(1.0 - poly * np.exp(-x * x), values)
+
+
+def box_profile(length: int, start: float, end: float, sigma: float) -> "np.ndarray":
+    # Coverage of [start, end) convolved with a Gaussian, sampled at pixel centres.
+    centers = np.arange(length, dtype=np.float64) + 0.5
+    if sigma <= 0:
+        return ((centers >= start) & (centers < end)).astype(np.float64)
+    scale = 1.0 / (math.sqrt(2.0) * sigma)
+    return 0.5 * (_erf((centers - start) * scale) - _erf((centers - end) * scale))
+
+
+def _tile_from_profiles(profile_y: "np.ndarray", profile_x: "np.ndarray", color: Color) -> Image.Image:
+    # The coverage is the outer product of the two profiles. It is built a few rows at a time in float32,
+    # so a wide shadow never holds more than the uint8 alpha at full size.
+    alpha = np.empty((len(profile_y), len(profile_x)), dtype=np.uint8)
+    row_x = (profile_x * color[3]).astype(np.float32)
+    step = max(1, COVERAGE_CHUNK_PIXELS // max(1, len(profile_x)))
+    for start in range(0, len(profile_y), step):
+        chunk = np.multiply.outer(profile_y[start : start + step].astype(np.float32), row_x)
+        np.rint(chunk, out=chunk).clip(0, 255, out=chunk)
+        alpha[start : start + step] = chunk
+    tile = Image.new("RGBA", (alpha.shape[1], alpha.shape[0]), color)
+    tile.putalpha(Image.fromarray(alpha, "L"))
+    return tile
+
+
+def _pil_soft(width: int, height: int, color: Color, blur_x: float, blur_y: float) -> Image.Image:
+    margin_x, margin_y = shadow_margin(blur_x), shadow_margin(blur_y)
+    tile = Image.new("RGBA", (width + 2 * margin_x, height + 2 * margin_y), color[:3] + (0,))
+    tile.paste(color, (margin_x, margin_y, margin_x + width, margin_y + height))
+    if blur_x == blur_y:
+        return tile.filter(ImageFilter.GaussianBlur(blur_x))
+    return tile.filter(ImageFilter.GaussianBlur((blur_x, blur_y)))
+
+
+def soft_rect(
+    width: int, height: int, color: Color, blur: float, rows: Rows = None
+) -> Tuple[Image.Image, Tuple[int, int]]:
+    # Returns the tile and its offset from the rectangle's top-left corner; rows count from that corner.
+    margin = shadow_margin(blur)
+    first, last = clip_rows(rows, -margin, height + margin)
+    if margin == 0:
+        return solid_rect(width, last - first, color), (0, first)
+    if np is None:
+        tile = _pil_soft(width, height, color, blur, blur)
+        if (first, last) != (-margin, height + margin):
+            tile = tile.crop((0, first + margin, tile.width, last + margin))
+        return tile, (-margin, first)
+    profile_x = box_profile(width + 2 * margin, margin, margin + width, blur)
+    profile_y = box_profile(height + 2 * margin, margin, margin + height, blur)[first + margin : last + margin]
+    return _tile_from_profiles(profile_y, profile_x, color), (-margin, first)
+
+
+def soft_divider(width: int, height: int, color: Color, blur: float) -> Tuple[Image.Image, int]:
+    # Blurs horizontally only: the bar spans the canvas height and is clamped at its edges,
+    # so every row is the same and a band needs only its own height.
+    margin = shadow_margin(blur)
+    if margin == 0:
+        return solid_rect(width, height, color), 0
+    if np is None:
+        return _pil_soft(width, height, color, blur, 0), -margin
+    profile_x = box_profile(width + 2 * margin, margin, margin + width, blur)
+    return _tile_from_profiles(np.ones(height), profile_x, color), -margin
+
+
+def _require_numpy(feature: str) -> None:
+    if np is None:
+        raise ImportError(f"{feature} need numpy (pip install numpy)")
+
+
+def _interpolate_stops(positions: "np.ndarray", stops: Sequence[ColorStop]) -> Image.Image:
+    ordered = sorted(stops, key=lambda stop: stop[0])
+    offsets = [offset for offset, _color in ordered]
+    channels = [
+        np.rint(np.interp(positions, offsets, [color[index] for _offset, color in ordered])).astype(np.uint8)
+        for index in range(4)
+    ]
+    return Image.fromarray(np.stack(channels, axis=-1), "RGBA")
+
+
+def linear_gradient(
+    width: int, height: int, stops: Sequence[ColorStop], angle: float = 0.0, rows: Rows = None
+) -> Image.Image:
+    # Angle 0 runs left to right, 90 top to bottom.
+    _require_numpy("Gradient fills")
+    radians = math.radians(angle)
+    dx, dy = math.cos(radians), math.sin(radians)
+    xs = np.arange(width, dtype=np.float64) + 0.5
+    ys = np.arange(*clip_rows(rows, 0, height), dtype=np.float64) + 0.5
+    projection = ys[:, None] * dy + xs[None, :] * dx
+    corners = [x * dx + y * dy for x in (0, width) for y in (0, height)]
+    start, end = min(corners), max(corners)
+    positions = (projection - start) / (end - start) if end > start else np.zeros_like(projection)
+    return _interpolate_stops(positions, stops)
+
+
+def radial_gradient(
+    width: int,
+    height: int,
+    stops: Sequence[ColorStop],
+    center: Tuple[float, float] = (0.5, 0.5),
+    radius: float = 0.5,
+    rows: Rows = None,
+) -> Image.Image:
+    # Center is a fraction of the box; radius is a fraction of its diagonal.
+    _require_numpy("Gradient fills")
+    cx, cy = center[0] * width, center[1] * height
+    radius_px = max(radius * math.hypot(width, height), 1e-6)
+    xs = np.arange(width, dtype=np.float64) + 0.5 - cx
+    ys = np.arange(*clip_rows(rows, 0, height), dtype=np.float64) + 0.5 - cy
+    positions = np.hypot(ys[:, None], xs[None, :]) / radius_px
+    return _interpolate_stops(positions, stops)
@@ -0,0 +1,138 @@
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from python.render_thumbnail import (
+    TemplateError,
+    compose_compiled,
+    load_compiled_template,
+    prepare_base,
+    read_json,
+    save_image,
+)
+
+
+SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.\-]+")
+
+
+def iter_variable_sets(source: Path) -> Iterator[Tuple[str, Any]]:
+    if source.is_dir():
+        for path in sorted(source.glob("*.json")):
+            try:
+                yield path.stem, read_json(path)
+            except TemplateError as exc:
+                yield path.stem, exc
+        return
+
+    if not source.exists():
+        raise TemplateError(f"Vars source not found: {source}")
+
+    suffix = source.suffix.lower()
+    if suffix == ".csv":
+        with source.open(newline="") as handle:
+            for index, row in enumerate(csv.DictReader(handle), start=1):
+                yield f"{index:05d}", dict(row)
+    elif suffix in {".jsonl", ".ndjson"}:
+        with source.open() as handle:
+            index = 0
+            for line in handle:
+                if not line.strip():
+                    continue
+                index += 1
+                try:
+                    yield f"{index:05d}", json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield f"{index:05d}", TemplateError(f"Invalid JSON on row {index}: {exc}")
+    else:
+        raise TemplateError(f"Vars source must be a directory, .jsonl or .csv file: {source}")
+
+
+def output_name(label: str, variables: Dict[str, Any], name_key: Optional[str]) -> str:
+    if name_key and variables.get(name_key):
+        label = str(variables[name_key])
+    return SAFE_NAME_RE.sub("_", label).strip("._") or "row"
+
+
+def unique_name(name: str, label: str, used: Set[str]) -> str:
+    # Rows that share a name (or sanitize to the same one) get their row label as a suffix.
+    if name in used:
+        name = f"{name}-{label}"
+        if name in used:
+            raise TemplateError(f"Row {label} output name '{name}' is already used in this batch")
+    used.add(name)
+    return name
+
+
+def render_batch(
+    input_path: Path,
+    template_path: Path,
+    vars_source: Path,
+    out_dir: Path,
+    extension: str = ".png",
+    name_key: Optional[str] = "name",
+    layer_threads: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    compiled = load_compiled_template(template_path, threads=layer_threads)
+    source = prepare_base(input_path, compiled.template, compiled.canvas)
+    used: Set[str] = set()
+
+    for label, variables in iter_variable_sets(vars_source):
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"row": label}
+        try:
+            if isinstance(variables, Exception):
+                raise variables
+            if not isinstance(variables, dict):
+                raise TemplateError(f"Row {label} must be a JSON object")
+            name = unique_name(output_name(label, variables, name_key), label, used)
+            output_path = out_dir / f"{name}{extension}"
+            save_image(compose_compiled(source.copy(), compiled, variables, threads=layer_threads), output_path)
+            result["output_path"] = str(output_path)
+        except (TemplateError, OSError, ValueError) as exc:
+            result["error"] = str(exc)
+        result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        yield result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render one template against many vars sets.")
+    parser.add_argument("--in", dest="input_path", required=True, help="Input JPG/PNG image")
+    parser.add_argument("--template", required=True, help="Template JSON path")
+    parser.add_argument("--vars", required=True, help="JSONL or CSV of vars sets, or a directory of vars JSON files")
+    parser.add_argument("--out-dir", required=True, help="Directory for rendered thumbnails")
+    parser.add_argument("--format", default="png", choices=["png", "jpg", "webp"], help="Output format")
+    parser.add_argument("--name-key", default="name", help="Vars key used as the output file name when present")
+    parser.add_argument("--layer-threads", type=int, default=0, help="Rasterize each row's layers concurrently")
+
+    args = parser.parse_args()
+    rendered = failed = 0
+    try:
+        for result in render_batch(
+            Path(args.input_path),
+            Path(args.template),
+            Path(args.vars),
+            Path(args.out_dir),
+            extension=f".{args.format}",
+            name_key=args.name_key,
+            layer_threads=args.layer_threads,
+        ):
+            if "error" in result:
+                failed += 1
+            else:
+                rendered += 1
+            print(json.dumps(result), flush=True)
+    except TemplateError as exc:
+        raise SystemExit(f"Error: {exc}") from exc
+
+    print(json.dumps({"rendered": rendered, "failed": failed}), file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from python.cache import LRUCache
+
+
+# Bump when a renderer change alters pixels for the same inputs.
+CACHE_VERSION = 4
+DEFAULT_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MB", 512)) * 1024 * 1024
+TMP_MARKER = ".tmp-"
+
+_FILE_DIGESTS = LRUCache(max_entries=1024)
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    def digest() -> str:
+        hasher = hashlib.sha256()
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    return _FILE_DIGESTS.get_or_create(key, digest)
+
+
+def input_digest(source: Union[str, Path, bytes, bytearray, memoryview]) -> str:
+    # Encoded images handed over in memory are hashed in place; files go through file_digest's memo.
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    return file_digest(source)
+
+
+def stable_hash(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    def key(
+        self,
+        source: Union[str, Path, bytes, bytearray, memoryview],
+        template: Any,
+        variables: Any,
+        fonts: Iterable[Union[str, Path]],
+        output_format: Any,
+        assets: Iterable[Union[str, Path]] = (),
+    ) -> str:
+        return stable_hash(
+            {
+                "version": CACHE_VERSION,
+                "input": input_digest(source),
+                "template": template,
+                "variables": variables,
+                "fonts": sorted(file_digest(path) for path in set(map(str, fonts))),
+                "assets": sorted(file_digest(path) for path in set(map(str, assets))),
+                "format": output_format,
+            }
+        )
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        return self.directory / f"{key}{suffix}"
+
+    def lookup(self, key: str, suffix: str) -> Optional[Path]:
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, key: str, suffix: str, write: Callable[[Path], None]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key, suffix)
+        tmp_path = self.directory / f"{key}{TMP_MARKER}{os.getpid()}-{threading.get_ident()}{suffix}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.evict()
+        return path
+
+    def copy_to(self, cached: Path, output_path: Path) -> None:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(f".{output_path.name}{TMP_MARKER}{os.getpid()}-{threading.get_ident()}")
+        shutil.copyfile(cached, tmp_path)
+        os.replace(tmp_path, output_path)
+
+    def evict(self) -> int:
+        with self._evict_lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or TMP_MARKER in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+            removed = 0
+            for _atime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = []
+        if self.directory.exists():
+            sizes = [
+                entry.stat().st_size
+                for entry in os.scandir(self.directory)
+                if entry.is_file() and TMP_MARKER not in entry.name
+            ]
+        return {"entries": len(sizes), "bytes": sum(sizes), "max_bytes": self.max_bytes}
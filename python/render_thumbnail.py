@@ -1,24 +1,70 @@
 import argparse
 import json
-import re
+import os
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, Tuple
-
-from PIL import Image, ImageDraw, ImageFilter, ImageFont
-
-
-PLACEHOLDER_RE = re.compile(r"\{\{\s*([a-zA-Z0-9_\-]+)\s*\}\}")
-
-
-@dataclass
-class CanvasSpec:
-    width: int
-    height: int
-
-
-class TemplateError(ValueError):
-    pass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image, ImageFont
+
+from python.cache import LRUCache
+from python.outputs import BandEncoder, OutputSpec, OutputSpecError, encode, encode_outputs
+from python.overlay_cache import OVERLAYS
+from python.preview import PREVIEW_RESAMPLE, preview_spec, scale_template
+from python.profiling import RenderHook, RenderProfiler, profile_end, profile_start
+from python.rect_effects import (
+    Rows,
+    clip_rows,
+    linear_gradient,
+    radial_gradient,
+    shadow_margin,
+    soft_divider,
+    soft_rect,
+    solid_rect,
+)
+from python.render_cache import DEFAULT_MAX_BYTES, RenderCache
+from python.source_cache import SOURCES, SourceCache
+from python.source_image import (
+    RESAMPLE_BLOCK_ROWS,
+    CoverSource,
+    DecodedSource,
+    ImageInput,
+    is_path,
+    load_cover,
+    open_cover,
+)
+from python.sprite_cache import SPRITES
+from python.template_ir import (
+    CanvasSpec,
+    DividerLayer,
+    Layer,
+    OverlayLayer,
+    PanelLayer,
+    TemplateError,
+    TextLayer,
+    compile_layers,
+    layer_assets,
+    load_font,
+    validate_template,
+)
+from python.text_layout import fit_text
+
+# Band-sized RGBA buffers alive at once in a banded render: the base band, the static-run
+# scratch, the encoder's copy and the widest effect tile with its float coverage.
+BAND_BUFFERS = 6
+
+# A rasterized piece of a layer and the canvas position of its top-left corner.
+Tile = Tuple[Image.Image, Tuple[int, int]]
+
+_LAYER_POOLS: Dict[int, ThreadPoolExecutor] = {}
+_LAYER_POOLS_LOCK = threading.Lock()
 
 
 def read_json(path: Path) -> Dict[str, Any]:
@@ -30,243 +76,618 @@ def read_json(path: Path) -> Dict[str, Any]:
         raise TemplateError(f"Missing JSON file: {path}") from exc
 
 
-def resolve_color(color: str, opacity: float | None = None) -> Tuple[int, int, int, int]:
-    if not isinstance(color, str) or not color.startswith("#"):
-        raise TemplateError(f"Color must be hex string like #RRGGBB: {color}")
-    hex_value = color.lstrip("#")
-    if len(hex_value) != 6:
-        raise TemplateError(f"Color must be 6-digit hex: {color}")
-    r = int(hex_value[0:2], 16)
-    g = int(hex_value[2:4], 16)
-    b = int(hex_value[4:6], 16)
-    alpha = 255
-    if opacity is not None:
-        alpha = int(max(0, min(1, opacity)) * 255)
-    return (r, g, b, alpha)
+def composite_tile(base: Image.Image, tile: Image.Image, position: Tuple[int, int], top: int = 0) -> int:
+    # Returns the number of canvas pixels touched. base may be a band of the canvas starting at row top.
+    x, y = position[0], position[1] - top
+    left = max(0, -x)
+    top = max(0, -y)
+    right = min(tile.width, base.width - x)
+    bottom = min(tile.height, base.height - y)
+    if right <= left or bottom <= top:
+        return 0
+    if (left, top, right, bottom) != (0, 0, tile.width, tile.height):
+        tile = tile.crop((left, top, right, bottom))
+    base.alpha_composite(tile, (x + left, y + top))
+    return (right - left) * (bottom - top)
 
 
-def substitute_vars(text: str, variables: Dict[str, Any]) -> str:
-    def replacer(match: re.Match[str]) -> str:
-        key = match.group(1)
-        if key not in variables:
-            raise TemplateError(f"Missing variable '{key}' for text '{text}'")
-        return str(variables[key])
+def rows_overlap(rows: Tuple[int, int], start: int, end: int) -> bool:
+    # Whether canvas rows [start, end) reach the band of canvas rows held by the base.
+    return start < rows[1] and end > rows[0]
 
-    return PLACEHOLDER_RE.sub(replacer, text)
 
+def panel_fill(layer: PanelLayer, rows: Rows = None) -> Image.Image:
+    width, height = layer.size
+    gradient = layer.gradient
+    if gradient is None:
+        first, last = clip_rows(rows, 0, height)
+        return solid_rect(width, last - first, layer.color)
+    if gradient.kind == "linear":
+        return linear_gradient(width, height, gradient.stops, angle=gradient.angle, rows=rows)
+    return radial_gradient(width, height, gradient.stops, center=gradient.center, radius=gradient.radius, rows=rows)
 
-def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
-    path = Path(font_path)
-    if not path.exists():
-        raise TemplateError(f"Font not found: {font_path}")
-    try:
-        return ImageFont.truetype(str(path), size=size)
-    except Exception as exc:
-        raise TemplateError(f"Unable to load font {font_path}: {exc}") from exc
-
-
-def anchor_point(anchor: str, canvas: CanvasSpec) -> Tuple[int, int]:
-    anchors = {
-        "top_left": (0, 0),
-        "top_center": (canvas.width // 2, 0),
-        "top_right": (canvas.width, 0),
-        "center_left": (0, canvas.height // 2),
-        "center": (canvas.width // 2, canvas.height // 2),
-        "center_right": (canvas.width, canvas.height // 2),
-        "bottom_left": (0, canvas.height),
-        "bottom_center": (canvas.width // 2, canvas.height),
-        "bottom_right": (canvas.width, canvas.height),
-    }
-    if anchor not in anchors:
-        raise TemplateError(f"Unknown anchor '{anchor}'")
-    return anchors[anchor]
 
+def rasterize_panel(layer: PanelLayer, rows: Tuple[int, int]) -> List[Tile]:
+    position = layer.position
+    width, height = layer.size
+    tiles: List[Tile] = []
 
-def position_from_anchor(anchor: str, position: Dict[str, int], canvas: CanvasSpec) -> Tuple[int, int]:
-    base_x, base_y = anchor_point(anchor, canvas)
-    x = base_x + int(position.get("x", 0))
-    y = base_y + int(position.get("y", 0))
-    return x, y
+    shadow = layer.shadow
+    if shadow:
+        blur = shadow.blur if shadow.soft else 0
+        reach = shadow_margin(blur)
+        shadow_y = position[1] + shadow.offset[1]
+        if rows_overlap(rows, shadow_y - reach, shadow_y + height + reach):
+            # Only the rows that land on base are built; the rest would be clipped anyway.
+            visible = (rows[0] - shadow_y, rows[1] - shadow_y)
+            shadow_img, (dx, dy) = soft_rect(width, height, shadow.color, blur, rows=visible)
+            tiles.append((shadow_img, (position[0] + dx + shadow.offset[0], shadow_y + dy)))
+
+    if rows_overlap(rows, position[1], position[1] + height):
+        visible = (rows[0] - position[1], rows[1] - position[1])
+        first, _last = clip_rows(visible, 0, height)
+        tiles.append((panel_fill(layer, rows=visible), (position[0], position[1] + first)))
+    return tiles
+
+
+def fit_layer_text(layer: TextLayer, text: str) -> Tuple[ImageFont.FreeTypeFont, str]:
+    fit = layer.fit
+    fitted = fit_text(
+        text,
+        lambda candidate: load_font(layer.font_path, candidate, layer.variation),
+        max_width=fit.max_width,
+        max_height=fit.max_height,
+        max_lines=fit.max_lines,
+        min_size=fit.min_size,
+        max_size=fit.max_size,
+        spacing=layer.spacing,
+        stroke_width=layer.stroke_width,
+        variation=layer.variation,
+    )
+    return fitted.font, fitted.text
 
 
-def cover_crop(image: Image.Image, canvas: CanvasSpec, anchor: str) -> Image.Image:
-    scale = max(canvas.width / image.width, canvas.height / image.height)
-    new_size = (int(image.width * scale), int(image.height * scale))
-    resized = image.resize(new_size, Image.LANCZOS)
-    if anchor == "center":
-        left = (resized.width - canvas.width) // 2
-        top = (resized.height - canvas.height) // 2
-    else:
-        left = (resized.width - canvas.width) // 2
-        top = (resized.height - canvas.height) // 2
-    return resized.crop((left, top, left + canvas.width, top + canvas.height))
+def rasterize_text(layer: TextLayer, variables: Dict[str, Any]) -> List[Tile]:
+    text = layer.pattern.render(variables)
+    font = layer.font
+    if layer.fit:
+        font, text = fit_layer_text(layer, text)
 
+    sprite = SPRITES.text(
+        text, font, layer.variation, layer.fill, layer.spacing, layer.align, layer.stroke_width, layer.stroke_color
+    )
+    x, y = layer.origin
+    if layer.align == "center":
+        x = x - sprite.width // 2
+    elif layer.align == "right":
+        x = x - sprite.width
+
+    tiles: List[Tile] = []
+    shadow = layer.shadow
+    if shadow:
+        # Every band composites the same blurred sprite, so banded renders match full ones.
+        glow = SPRITES.shadow(text, font, layer.variation, shadow.color, layer.spacing, layer.align, shadow.blur)
+        tiles.append((glow.images[0], (x + glow.offset[0] + shadow.offset[0], y + glow.offset[1] + shadow.offset[1])))
+    tiles.extend((image, (x + sprite.offset[0], y + sprite.offset[1])) for image in sprite.images)
+    return tiles
 
-def apply_panel(base: Image.Image, layer: Dict[str, Any], canvas: CanvasSpec) -> None:
-    position = position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas)
-    size = layer.get("size")
-    if not size:
-        raise TemplateError(f"Panel layer '{layer.get('name')}' missing size")
-    width = int(size.get("width"))
-    height = int(size.get("height"))
-    fill = layer.get("fill", {})
-    color = resolve_color(fill.get("color", "#000000"), fill.get("opacity", 1.0))
 
-    panel = Image.new("RGBA", (width, height), color)
+def rasterize_overlay(layer: OverlayLayer) -> List[Tile]:
+    try:
+        overlay = OVERLAYS.get(layer.path, layer.size, layer.opacity)
+    except FileNotFoundError as exc:
+        raise TemplateError(f"Overlay not found: {layer.path}") from exc
+    return [(overlay, layer.position)]
 
-    shadow = layer.get("shadow")
-    if shadow:
-        shadow_color = resolve_color(shadow.get("color", "#000000"), shadow.get("opacity", 0.5))
-        shadow_img = Image.new("RGBA", (width, height), shadow_color)
-        blur = int(shadow.get("blur", 0))
-        if blur > 0:
-            shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(blur))
-        offset = shadow.get("offset", {"x": 0, "y": 0})
-        base.alpha_composite(shadow_img, (position[0] + int(offset.get("x", 0)), position[1] + int(offset.get("y", 0))))
 
-    base.alpha_composite(panel, position)
+def rasterize_divider(layer: DividerLayer, canvas: CanvasSpec, rows: Tuple[int, int]) -> List[Tile]:
+    first, last = clip_rows(rows, 0, canvas.height)
+    if last <= first:
+        return []
+    divider, dx = soft_divider(layer.width, last - first, layer.color, layer.blur if layer.soft else 0)
+    return [(divider, (layer.center - layer.width // 2 + dx, first))]
 
 
-def text_bbox(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, spacing: int) -> Tuple[int, int, int, int]:
-    return draw.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+def load_template(template_path: Path) -> Tuple[Dict[str, Any], CanvasSpec]:
+    template = read_json(template_path)
+    return template, validate_template(template)
 
 
-def apply_text(base: Image.Image, layer: Dict[str, Any], canvas: CanvasSpec, variables: Dict[str, Any]) -> None:
-    raw_text = layer.get("text", "")
-    text = substitute_vars(raw_text, variables)
-    font_spec = layer.get("font")
-    if not font_spec:
-        raise TemplateError(f"Text layer '{layer.get('name')}' missing font")
-    font = load_font(font_spec.get("path"), int(font_spec.get("size")))
+def check_source(input_path: ImageInput, template: Dict[str, Any]) -> None:
+    if is_path(input_path) and not Path(input_path).exists():
+        raise TemplateError(f"Input image not found: {input_path}")
 
-    align = layer.get("align", "left")
-    spacing = int(layer.get("line_spacing", 0))
-    padding = layer.get("padding", {"x": 0, "y": 0})
+    crop = template.get("crop", {"strategy": "cover", "anchor": "center"})
+    if crop.get("strategy") != "cover":
+        raise TemplateError("Only crop strategy 'cover' is supported")
 
-    draw = ImageDraw.Draw(base)
-    bbox = text_bbox(draw, text, font, spacing)
-    text_width = bbox[2] - bbox[0]
 
-    position = position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas)
-    x = position[0] + int(padding.get("x", 0))
-    y = position[1] + int(padding.get("y", 0))
+def load_source(
+    input_path: ImageInput,
+    template: Dict[str, Any],
+    canvas: CanvasSpec,
+    profiler: Optional[RenderHook] = None,
+    resample: int = Image.LANCZOS,
+    sources: Optional[SourceCache] = SOURCES,
+) -> DecodedSource:
+    check_source(input_path, template)
+    if sources is None:
+        return load_cover(input_path, canvas.width, canvas.height, profiler=profiler, resample=resample)
+    anchor = template.get("crop", {}).get("anchor", "center")
+    return sources.load(input_path, canvas.width, canvas.height, anchor, profiler=profiler, resample=resample)
+
+
+def open_source(
+    input_path: ImageInput,
+    template: Dict[str, Any],
+    canvas: CanvasSpec,
+    profiler: Optional[RenderHook] = None,
+    resample: int = Image.LANCZOS,
+) -> CoverSource:
+    check_source(input_path, template)
+    return open_cover(input_path, canvas.width, canvas.height, profiler=profiler, resample=resample)
+
+
+def prepare_base(input_path: ImageInput, template: Dict[str, Any], canvas: CanvasSpec) -> Image.Image:
+    return load_source(input_path, template, canvas).image
+
+
+def rasterize_layer(layer: Layer, canvas: CanvasSpec, variables: Dict[str, Any], rows: Tuple[int, int]) -> List[Tile]:
+    # Tiles in z-order with their canvas positions. Rasterizing reads only the layer, so layers
+    # can be rasterized concurrently and composited in order afterwards.
+    if isinstance(layer, PanelLayer):
+        return rasterize_panel(layer, rows)
+    if isinstance(layer, TextLayer):
+        return rasterize_text(layer, variables)
+    if isinstance(layer, OverlayLayer):
+        return rasterize_overlay(layer)
+    if isinstance(layer, DividerLayer):
+        return rasterize_divider(layer, canvas, rows)
+    raise TemplateError(f"Unknown layer type '{type(layer).__name__}'")
+
+
+def rasterize_timed(
+    layer: Layer, canvas: CanvasSpec, variables: Dict[str, Any], rows: Tuple[int, int]
+) -> Tuple[List[Tile], float]:
+    started = time.perf_counter()
+    tiles = rasterize_layer(layer, canvas, variables, rows)
+    return tiles, time.perf_counter() - started
+
+
+def layer_pool(threads: int) -> ThreadPoolExecutor:
+    # One long-lived pool per size, shared by every render in the process.
+    with _LAYER_POOLS_LOCK:
+        pool = _LAYER_POOLS.get(threads)
+        if pool is None:
+            pool = _LAYER_POOLS[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="layers")
+        return pool
+
+
+def start_rasterize(
+    layers: Sequence[Layer],
+    canvas: CanvasSpec,
+    variables: Dict[str, Any],
+    rows: Tuple[int, int],
+    threads: int = 0,
+) -> List[Callable[[], Tuple[List[Tile], float]]]:
+    # One result getter per layer. With threads the layers rasterize concurrently on the shared
+    # pool (Pillow drops the GIL for blurs, resizes and fills); otherwise each runs when collected.
+    if threads > 1 and len(layers) > 1:
+        pool = layer_pool(threads)
+        return [pool.submit(rasterize_timed, layer, canvas, variables, rows).result for layer in layers]
+    return [partial(rasterize_timed, layer, canvas, variables, rows) for layer in layers]
+
+
+def composite_layer(
+    base: Image.Image,
+    layer: Layer,
+    raster: Callable[[], Tuple[List[Tile], float]],
+    profiler: Optional[RenderHook],
+    stage: str = "layer",
+    top: int = 0,
+) -> None:
+    tiles, raster_seconds = raster()
+    mark = profile_start(profiler)
+    area = sum(composite_tile(base, tile, position, top) for tile, position in tiles)
+    if mark is not None:
+        # Charge the layer with its rasterize time as well, which may have run on a pool thread.
+        mark = (mark[0] - raster_seconds,) + mark[1:]
+    profile_end(profiler, mark, stage, area=area, name=layer.name, type=layer.kind)
+
+
+def apply_layers(
+    base: Image.Image,
+    layers: Sequence[Layer],
+    canvas: CanvasSpec,
+    variables: Dict[str, Any],
+    profiler: Optional[RenderHook] = None,
+    stage: str = "layer",
+    top: int = 0,
+    threads: int = 0,
+) -> None:
+    rasters = start_rasterize(layers, canvas, variables, (top, top + base.height), threads)
+    for layer, raster in zip(layers, rasters):
+        composite_layer(base, layer, raster, profiler, stage, top)
+
+
+def compose(
+    base: Image.Image,
+    template: Dict[str, Any],
+    canvas: CanvasSpec,
+    variables: Dict[str, Any],
+    profiler: Optional[RenderHook] = None,
+    threads: int = 0,
+) -> Image.Image:
+    apply_layers(base, compile_layers(template, canvas), canvas, variables, profiler, threads=threads)
+    return base
+
+
+@dataclass(frozen=True, slots=True)
+class Plate:
+    image: Image.Image
+    offset: Tuple[int, int]
+    names: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledTemplate:
+    template: Dict[str, Any]
+    canvas: CanvasSpec
+    layers: Tuple[Layer, ...]
+    steps: Tuple[Union[Plate, Layer], ...]
+    dependencies: Tuple[Tuple[str, int], ...] = ()
+
+    def is_fresh(self) -> bool:
+        for path, mtime_ns in self.dependencies:
+            try:
+                if Path(path).stat().st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def is_dynamic_layer(layer: Layer) -> bool:
+    return isinstance(layer, TextLayer) and bool(layer.pattern.names)
+
+
+def flatten_static_layers(
+    layers: List[Layer],
+    canvas: CanvasSpec,
+    profiler: Optional[RenderHook] = None,
+    threads: int = 0,
+) -> Optional[Plate]:
+    plate = Image.new("RGBA", (canvas.width, canvas.height), (0, 0, 0, 0))
+    apply_layers(plate, layers, canvas, {}, profiler, stage="compile", threads=threads)
+    bbox = plate.getbbox()
+    if bbox is None:
+        return None
+    names = tuple(str(layer.name or layer.kind) for layer in layers)
+    return Plate(image=plate.crop(bbox), offset=(bbox[0], bbox[1]), names=names)
+
+
+def layer_runs(layers: Sequence[Layer]) -> List[Union[List[Layer], Layer]]:
+    # Stack order, with consecutive static layers grouped into one list (one plate when compiled).
+    runs: List[Union[List[Layer], Layer]] = []
+    for layer in layers:
+        if is_dynamic_layer(layer):
+            runs.append(layer)
+        elif runs and isinstance(runs[-1], list):
+            runs[-1].append(layer)
+        else:
+            runs.append([layer])
+    return runs
+
+
+def layer_dependencies(layers: Sequence[Layer]) -> Tuple[Tuple[str, int], ...]:
+    dependencies = []
+    for path in layer_assets(layers):
+        try:
+            dependencies.append((path, Path(path).stat().st_mtime_ns))
+        except OSError:
+            continue
+    return tuple(dependencies)
+
+
+def compile_template(
+    template: Dict[str, Any],
+    canvas: Optional[CanvasSpec] = None,
+    profiler: Optional[RenderHook] = None,
+    flatten: bool = True,
+    layers: Optional[Tuple[Layer, ...]] = None,
+    threads: int = 0,
+) -> CompiledTemplate:
+    # Every layer is parsed and its fonts and overlays loaded before any pixel work, so a bad
+    # template fails here rather than after a large source has been decoded.
+    canvas = canvas or validate_template(template)
+    if layers is None:
+        layers = compile_layers(template, canvas)
+    steps: List[Union[Plate, Layer]] = []
+    for run in layer_runs(layers) if flatten else layers:
+        if not isinstance(run, list):
+            steps.append(run)
+            continue
+        plate = flatten_static_layers(run, canvas, profiler, threads)
+        if plate is not None:
+            steps.append(plate)
+
+    return CompiledTemplate(
+        template=template,
+        canvas=canvas,
+        layers=layers,
+        steps=tuple(steps),
+        dependencies=layer_dependencies(layers),
+    )
 
-    if align == "center":
-        x = x - text_width // 2
-    elif align == "right":
-        x = x - text_width
 
-    fill = layer.get("fill", "#FFFFFF")
-    stroke = layer.get("stroke", {})
-    stroke_color = stroke.get("color", "#000000")
-    stroke_width = int(stroke.get("width", 0))
+_COMPILED_TEMPLATES = LRUCache(max_entries=32)
 
-    shadow = layer.get("shadow")
-    if shadow:
-        shadow_color = resolve_color(shadow.get("color", "#000000"), shadow.get("opacity", 0.5))
-        shadow_layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
-        shadow_draw = ImageDraw.Draw(shadow_layer)
-        shadow_draw.multiline_text((x, y), text, font=font, fill=shadow_color, spacing=spacing, align=align)
-        blur = int(shadow.get("blur", 0))
-        if blur > 0:
-            shadow_layer = shadow_layer.filter(ImageFilter.GaussianBlur(blur))
-        offset = shadow.get("offset", {"x": 0, "y": 0})
-        base.alpha_composite(shadow_layer, (int(offset.get("x", 0)), int(offset.get("y", 0))))
-
-    draw.multiline_text(
-        (x, y),
-        text,
-        font=font,
-        fill=fill,
-        spacing=spacing,
-        align=align,
-        stroke_width=stroke_width,
-        stroke_fill=stroke_color,
-    )
+
+def load_scaled_template(template_path: Path, scale: float = 1.0) -> Tuple[Dict[str, Any], CanvasSpec]:
+    template, canvas = load_template(template_path)
+    if scale != 1:
+        template = scale_template(template, scale)
+        canvas = validate_template(template)
+    return template, canvas
 
 
-def apply_overlay(base: Image.Image, layer: Dict[str, Any], canvas: CanvasSpec) -> None:
-    path = layer.get("path")
-    if not path:
-        raise TemplateError(f"Overlay layer '{layer.get('name')}' missing path")
-    overlay_path = Path(path)
-    if not overlay_path.exists():
-        raise TemplateError(f"Overlay not found: {path}")
-    overlay = Image.open(overlay_path).convert("RGBA")
-    size = layer.get("size")
-    if size:
-        overlay = overlay.resize((int(size.get("width")), int(size.get("height"))), Image.LANCZOS)
-
-    opacity = float(layer.get("opacity", 1.0))
-    if opacity < 1.0:
-        alpha = overlay.getchannel("A")
-        alpha = alpha.point(lambda p: int(p * opacity))
-        overlay.putalpha(alpha)
-
-    position = position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas)
-    base.alpha_composite(overlay, position)
-
-
-def apply_divider(base: Image.Image, layer: Dict[str, Any], canvas: CanvasSpec) -> None:
-    width = int(layer.get("width", 4))
-    position_x = int(layer.get("position", canvas.width // 2))
-    color = resolve_color(layer.get("color", "#FFFFFF"), layer.get("opacity", 1.0))
-    divider = Image.new("RGBA", (width, canvas.height), color)
-    blur = int(layer.get("blur", 0))
-    if blur > 0:
-        divider = divider.filter(ImageFilter.GaussianBlur(blur))
-    base.alpha_composite(divider, (position_x - width // 2, 0))
-
-
-def validate_template(template: Dict[str, Any]) -> CanvasSpec:
-    if "canvas" not in template:
-        raise TemplateError("Template missing canvas")
-    canvas = template["canvas"]
+def load_compiled_template(
+    template_path: Path,
+    profiler: Optional[RenderHook] = None,
+    scale: float = 1.0,
+    flatten: bool = True,
+    threads: int = 0,
+) -> CompiledTemplate:
+    # flatten=False keeps every layer as a step: no full-canvas plates, for banded renders and
+    # for callers that only need the validated layers.
+    mark = profile_start(profiler)
     try:
-        width = int(canvas["width"])
-        height = int(canvas["height"])
-    except Exception as exc:
-        raise TemplateError("Canvas width/height must be integers") from exc
-    if width <= 0 or height <= 0:
-        raise TemplateError("Canvas width/height must be positive")
-    if "layers" not in template or not isinstance(template["layers"], list):
-        raise TemplateError("Template missing layers list")
-    return CanvasSpec(width=width, height=height)
-
-
-def render_thumbnail(input_path: Path, template_path: Path, vars_path: Path, output_path: Path) -> None:
-    template = read_json(template_path)
-    variables = read_json(vars_path)
-    canvas = validate_template(template)
+        key = (str(template_path.resolve()), template_path.stat().st_mtime_ns, scale, flatten)
+    except OSError as exc:
+        raise TemplateError(f"Missing JSON file: {template_path}") from exc
+    compiled = _COMPILED_TEMPLATES.get(key)
+    if compiled is not None and compiled.is_fresh():
+        profile_end(profiler, mark, "template", name=template_path.name, cached=True)
+        return compiled
+    template, canvas = load_scaled_template(template_path, scale)
+    layers = compile_layers(template, canvas)
+    profile_end(profiler, mark, "template", name=template_path.name, cached=False)
+    compiled = compile_template(template, canvas, profiler, flatten=flatten, layers=layers, threads=threads)
+    _COMPILED_TEMPLATES.put(key, compiled)
+    return compiled
+
+
+def compose_compiled(
+    base: Image.Image,
+    compiled: CompiledTemplate,
+    variables: Dict[str, Any],
+    profiler: Optional[RenderHook] = None,
+    threads: int = 0,
+) -> Image.Image:
+    layers = [step for step in compiled.steps if not isinstance(step, Plate)]
+    rasters = iter(start_rasterize(layers, compiled.canvas, variables, (0, base.height), threads))
+    for step in compiled.steps:
+        if not isinstance(step, Plate):
+            composite_layer(base, step, next(rasters), profiler)
+        elif profiler is None:
+            base.alpha_composite(step.image, step.offset)
+        else:
+            mark = profile_start(profiler)
+            base.alpha_composite(step.image, step.offset)
+            profile_end(
+                profiler,
+                mark,
+                "layer",
+                area=step.image.width * step.image.height,
+                name="+".join(step.names),
+                type="plate",
+            )
+    return base
+
+
+def compose_band(
+    base: Image.Image,
+    compiled: CompiledTemplate,
+    variables: Dict[str, Any],
+    top: int,
+    profiler: Optional[RenderHook] = None,
+) -> Image.Image:
+    # compose_compiled for the rows of base only: static runs are drawn into a band-sized
+    # scratch instead of compositing full-canvas plates, which gives the same pixels.
+    # Static layers have no placeholders, so rasterizing them with the variables changes nothing.
+    # Layers rasterize one at a time: rasters started together on a pool would all be alive at
+    # once, outside the band budget.
+    canvas = compiled.canvas
+    rasters = iter(start_rasterize(compiled.layers, canvas, variables, (top, top + base.height)))
+    for run in layer_runs(compiled.layers):
+        if not isinstance(run, list):
+            composite_layer(base, run, next(rasters), profiler, top=top)
+            continue
+        scratch = Image.new("RGBA", base.size, (0, 0, 0, 0))
+        for layer in run:
+            composite_layer(scratch, layer, next(rasters), profiler, top=top)
+        if scratch.getbbox() is not None:
+            base.alpha_composite(scratch)
+    return base
+
+
+def band_height(canvas: CanvasSpec, memory_budget: int) -> int:
+    rows = max(1, memory_budget // (canvas.width * 4 * BAND_BUFFERS))
+    if rows >= RESAMPLE_BLOCK_ROWS:
+        # Whole resample blocks, so no source block is resampled twice.
+        rows -= rows % RESAMPLE_BLOCK_ROWS
+    return min(rows, canvas.height)
+
+
+def render_banded(
+    input_path: ImageInput,
+    compiled: CompiledTemplate,
+    variables: Dict[str, Any],
+    specs: Sequence[OutputSpec],
+    memory_budget: int,
+    profiler: Optional[RenderHook] = None,
+    resample: int = Image.LANCZOS,
+) -> Tuple[CoverSource, List[Dict[str, Any]]]:
+    # Resample, compose and encode one horizontal band at a time. Shadows and blurs are drawn as
+    # whole tiles clipped per band, so halos crossing band edges match a full render.
+    if memory_budget <= 0:
+        raise TemplateError("Memory budget must be positive")
+    canvas = compiled.canvas
+    cover = open_source(input_path, compiled.template, canvas, profiler, resample=resample)
+    rows = band_height(canvas, memory_budget)
+    encoders: List[BandEncoder] = []
+    try:
+        encoders.extend(BandEncoder(spec, (canvas.width, canvas.height)) for spec in specs)
+        for top in range(0, canvas.height, rows):
+            mark = profile_start(profiler)
+            band = cover.rows(top, min(top + rows, canvas.height))
+            profile_end(profiler, mark, "crop", area=band.width * band.height, name=f"rows {top}-{top + band.height}")
+            compose_band(band, compiled, variables, top, profiler)
+            mark = profile_start(profiler)
+            for encoder in encoders:
+                encoder.write(band)
+            profile_end(profiler, mark, "save", area=band.width * band.height, name=f"rows {top}-{top + band.height}")
+            del band
+        mark = profile_start(profiler)
+        encoded = [encoder.close() for encoder in encoders]
+        profile_end(profiler, mark, "save", name=", ".join(spec.label for spec in specs))
+    except BaseException as exc:
+        for encoder in encoders:
+            encoder.discard()
+        if isinstance(exc, OutputSpecError):
+            raise TemplateError(str(exc)) from exc
+        raise
+    return cover, encoded
+
+
+def save_image(image: Image.Image, output_path: Path) -> Dict[str, Any]:
+    try:
+        return encode(image, OutputSpec(output_path))
+    except OutputSpecError as exc:
+        raise TemplateError(str(exc)) from exc
 
-    if not input_path.exists():
-        raise TemplateError(f"Input image not found: {input_path}")
 
-    image = Image.open(input_path).convert("RGBA")
-    crop = template.get("crop", {"strategy": "cover", "anchor": "center"})
-    if crop.get("strategy") != "cover":
-        raise TemplateError("Only crop strategy 'cover' is supported")
+def template_files(compiled: CompiledTemplate) -> Tuple[List[str], List[str]]:
+    # Compiling already checked that every file exists.
+    fonts = [layer.font_path for layer in compiled.layers if isinstance(layer, TextLayer)]
+    assets = [layer.path for layer in compiled.layers if isinstance(layer, OverlayLayer)]
+    return fonts, assets
 
-    base = cover_crop(image, canvas, crop.get("anchor", "center"))
-
-    for layer in template["layers"]:
-        layer_type = layer.get("type")
-        if layer_type == "panel":
-            apply_panel(base, layer, canvas)
-        elif layer_type == "text":
-            apply_text(base, layer, canvas, variables)
-        elif layer_type == "overlay":
-            apply_overlay(base, layer, canvas)
-        elif layer_type == "divider":
-            apply_divider(base, layer, canvas)
-        else:
-            raise TemplateError(f"Unknown layer type '{layer_type}'")
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    if output_path.suffix.lower() in {".jpg", ".jpeg"}:
-        base.convert("RGB").save(output_path, quality=95)
+def cacheable(input_path: ImageInput, specs: Sequence[OutputSpec]) -> bool:
+    # Descriptors and file objects can be read only once, and streamed outputs are gone once written.
+    if any(spec.stream is not None for spec in specs):
+        return False
+    if is_path(input_path):
+        return Path(input_path).exists()
+    return isinstance(input_path, (bytes, bytearray, memoryview))
+
+
+def deliver_cached(cache: RenderCache, cached: Path, spec: OutputSpec) -> Dict[str, Any]:
+    output: Dict[str, Any] = {
+        "path": str(spec.path) if spec.path is not None else None,
+        "format": spec.resolved_format,
+        "bytes": cached.stat().st_size,
+    }
+    if spec.path is None:
+        output["data"] = cached.read_bytes()
     else:
-        base.save(output_path)
+        cache.copy_to(cached, spec.path)
+    return output
+
+
+def store_cached(path: Path, spec: OutputSpec, output: Dict[str, Any]) -> None:
+    if spec.path is None:
+        path.write_bytes(output["data"])
+    else:
+        shutil.copyfile(spec.path, path)
+
+
+def render_thumbnail(
+    input_path: ImageInput,
+    template_path: Path,
+    vars_path: Union[Path, Dict[str, Any]],
+    output_path: Optional[Path],
+    cache: Optional[RenderCache] = None,
+    outputs: Sequence[OutputSpec] = (),
+    encode_threads: int = 0,
+    profiler: Optional[RenderHook] = None,
+    preview_scale: Optional[float] = None,
+    memory_budget: Optional[int] = None,
+    layer_threads: int = 0,
+) -> Dict[str, Any]:
+    # input_path may also be the encoded image in memory, a descriptor or a file object, and
+    # outputs without a path return their bytes as "data" (or write them to their stream).
+    specs = ([OutputSpec(output_path)] if output_path else []) + list(outputs)
+    if not specs:
+        raise TemplateError("At least one output is required")
+    if preview_scale is not None:
+        if not 0 < preview_scale <= 1:
+            raise TemplateError("Preview scale must be in (0, 1]")
+        specs = [preview_spec(spec, preview_scale) for spec in specs]
+    # Banded renders skip the compiled plates: they are full-canvas buffers.
+    compiled = load_compiled_template(
+        template_path, profiler, scale=preview_scale or 1.0, flatten=memory_budget is None, threads=layer_threads
+    )
+    template, canvas = compiled.template, compiled.canvas
+    variables = vars_path if isinstance(vars_path, dict) else read_json(vars_path)
+
+    result: Dict[str, Any] = {"output_path": str(specs[0].path) if specs[0].path is not None else None}
+    if preview_scale is not None:
+        result["preview_scale"] = preview_scale
+    cache_keys: List[str] = []
+    if cache is not None and cacheable(input_path, specs):
+        mark = profile_start(profiler)
+        fonts, assets = template_files(compiled)
+        try:
+            cache_keys = [
+                cache.key(
+                    input_path,
+                    template,
+                    variables,
+                    fonts=fonts,
+                    output_format=spec.cache_format(),
+                    assets=assets,
+                )
+                for spec in specs
+            ]
+        except OutputSpecError as exc:
+            raise TemplateError(str(exc)) from exc
+        hits = [cache.lookup(key, spec.suffix) for key, spec in zip(cache_keys, specs)]
+        profile_end(profiler, mark, "cache", hit=all(hit is not None for hit in hits))
+        if all(hit is not None for hit in hits):
+            result["outputs"] = [deliver_cached(cache, hit, spec) for hit, spec in zip(hits, specs)]
+            result["cache"] = "hit"
+            return result
+
+    resample = PREVIEW_RESAMPLE if preview_scale is not None else Image.LANCZOS
+    if memory_budget is not None:
+        source, encoded = render_banded(
+            input_path, compiled, variables, specs, memory_budget, profiler, resample=resample
+        )
+        result["band_rows"] = band_height(canvas, memory_budget)
+    else:
+        source = load_source(input_path, template, canvas, profiler, resample=resample)
+        base = compose_compiled(source.image, compiled, variables, profiler, threads=layer_threads)
+        mark = profile_start(profiler)
+        try:
+            encoded = encode_outputs(base, specs, threads=encode_threads)
+        except OutputSpecError as exc:
+            raise TemplateError(str(exc)) from exc
+        profile_end(
+            profiler,
+            mark,
+            "save",
+            area=sum(output["size"][0] * output["size"][1] for output in encoded),
+            name=", ".join(spec.label for spec in specs),
+        )
+    result.update(source.describe())
+    result["outputs"] = encoded
+    if cache_keys:
+        for key, spec, output in zip(cache_keys, specs, encoded):
+            cache.store(key, spec.suffix, lambda path, spec=spec, output=output: store_cached(path, spec, output))
+        result["cache"] = "miss"
+    return result
 
 
 def main() -> None:
@@ -274,18 +695,74 @@ def main() -> None:
     parser.add_argument("--in", dest="input_path", required=True, help="Input JPG/PNG image")
     parser.add_argument("--template", required=True, help="Template JSON path")
     parser.add_argument("--vars", required=True, help="Vars JSON path")
-    parser.add_argument("--out", required=True, help="Output PNG/JPG path")
+    parser.add_argument("--out", help="Output PNG/JPG/WebP path")
+    parser.add_argument(
+        "--output",
+        action="append",
+        default=[],
+        metavar="SPEC",
+        help="Extra output encoded from the same canvas, e.g. out/small.webp,size=320x180,quality=80,method=6",
+    )
+    parser.add_argument(
+        "--preview",
+        type=float,
+        metavar="SCALE",
+        help="Fast draft render at a fraction of the canvas size, e.g. 0.25 or 0.5",
+    )
+    parser.add_argument("--encode-threads", type=int, default=0, help="Encode outputs in parallel threads")
+    parser.add_argument(
+        "--layer-threads",
+        type=int,
+        default=int(os.environ.get("THUMBNAIL_LAYER_THREADS", 0)),
+        help="Rasterize layers concurrently on a shared thread pool; compositing keeps the layer order. "
+        "Ignored with --memory-budget-mb, which rasterizes one layer at a time",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        help="Render in horizontal bands so compositing and encoding buffers stay within this budget",
+    )
+    parser.add_argument("--cache-dir", help="Reuse identical renders from this on-disk cache")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage and per-layer timing table to stderr")
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also trace Python-heap allocations (slower; approximate per layer with --layer-threads)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Render cache size before LRU eviction",
+    )
 
     args = parser.parse_args()
+    if not args.out and not args.output:
+        parser.error("one of --out or --output is required")
+    cache = RenderCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024) if args.cache_dir else None
+    profiler = RenderProfiler() if args.profile or args.profile_memory else None
+    if args.profile_memory:
+        tracemalloc.start()
     try:
-        render_thumbnail(
+        result = render_thumbnail(
             Path(args.input_path),
             Path(args.template),
             Path(args.vars),
-            Path(args.out),
+            Path(args.out) if args.out else None,
+            cache=cache,
+            outputs=[OutputSpec.parse(spec) for spec in args.output],
+            encode_threads=args.encode_threads,
+            profiler=profiler,
+            preview_scale=args.preview,
+            memory_budget=int(args.memory_budget_mb * 1024 * 1024) if args.memory_budget_mb else None,
+            layer_threads=args.layer_threads,
         )
-    except TemplateError as exc:
+    except (TemplateError, OutputSpecError) as exc:
         raise SystemExit(f"Error: {exc}") from exc
+    if profiler is not None:
+        print(profiler.table(), file=sys.stderr)
+        result["timings"] = profiler.timings()
+    print(json.dumps(result))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+import os
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from python.cache import LRUCache
+from python.overlay_cache import image_bytes
+from python.profiling import RenderHook, profile_end, profile_start
+from python.render_cache import input_digest
+from python.source_image import DecodedSource, ImageInput, is_path, load_cover
+
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get("THUMBNAIL_SOURCE_CACHE_MB", 256)) * 1024 * 1024
+
+
+def source_bytes(source: DecodedSource) -> int:
+    return image_bytes(source.image)
+
+
+class SourceCache:
+    # Canvas-sized RGBA bases, keyed by the input's content hash, canvas size, crop anchor and
+    # resampling filter, so re-rendering the same background with new text skips decode and resize.
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET_BYTES) -> None:
+        self._sources = LRUCache(max_bytes=max_bytes, sizeof=source_bytes)
+
+    def load(
+        self,
+        source: ImageInput,
+        width: int,
+        height: int,
+        anchor: str = "center",
+        profiler: Optional[RenderHook] = None,
+        resample: int = Image.LANCZOS,
+    ) -> DecodedSource:
+        # Descriptors and file objects can only be read once, so they are decoded every time.
+        if not (is_path(source) or isinstance(source, (bytes, bytearray, memoryview))):
+            return load_cover(source, width, height, profiler=profiler, resample=resample)
+        mark = profile_start(profiler)
+        key = (input_digest(source), width, height, anchor, resample)
+        cached = self._sources.get(key)
+        hit = cached is not None
+        if not hit:
+            # The lookup is closed first, so the decode and crop events are not nested inside it.
+            profile_end(profiler, mark, "cache", name="source", hit=hit)
+            cached = load_cover(source, width, height, profiler=profiler, resample=resample)
+            self._sources.put(key, cached)
+            mark = profile_start(profiler)
+        # Layers are composited onto the base in place, so every render gets its own copy.
+        decoded = DecodedSource(
+            image=cached.image.copy(), source_size=cached.source_size, decoded_size=cached.decoded_size
+        )
+        profile_end(profiler, mark, "cache", area=width * height, name="source", hit=hit)
+        return decoded
+
+    def stats(self) -> Dict[str, Any]:
+        return self._sources.stats()
+
+    def clear(self) -> None:
+        self._sources.clear()
+
+
+SOURCES = SourceCache()
@@ -0,0 +1,236 @@
+import io
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+from PIL import Image
+
+from python.profiling import RenderHook, profile_end, profile_start
+
+
+# Decode and pre-shrink to at least this multiple of the final size so the
+# last LANCZOS pass still has real detail to work with (Pillow's thumbnail()
+# uses the same 2.0 gap for JPEG draft mode).
+DRAFT_GAP = 2.0
+REDUCING_GAP = 3.0
+
+RESAMPLE_MODES = {"RGB", "RGBA", "L", "LA"}
+
+# Output rows are resampled in fixed blocks, so a render done in bands gets exactly the
+# pixels of a full render (Pillow's filter weights depend on the requested box).
+RESAMPLE_BLOCK_ROWS = 128
+
+# Filter reach in source pixels, as used by Pillow to pick the region it pre-reduces.
+FILTER_SUPPORT = {Image.BOX: 0.5, Image.BILINEAR: 1.0, Image.HAMMING: 1.0, Image.BICUBIC: 2.0, Image.LANCZOS: 3.0}
+
+Box = Tuple[float, float, float, float]
+
+# A source image: a path, the encoded bytes (or any buffer), an open file descriptor or a binary file object.
+ImageInput = Union[str, Path, bytes, bytearray, memoryview, int, BinaryIO]
+
+
+@dataclass
+class DecodedSource:
+    image: Image.Image
+    source_size: Tuple[int, int]
+    decoded_size: Tuple[int, int]
+
+    def describe(self) -> Dict[str, Any]:
+        return {"source_size": list(self.source_size), "decoded_size": list(self.decoded_size)}
+
+
+class BufferReader(io.RawIOBase):
+    # A seekable, read-only file over a buffer. io.BytesIO shares bytes but copies any other
+    # buffer whole; decoders read this one a block at a time.
+    def __init__(self, data: Union[bytearray, memoryview]) -> None:
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        chunk = self._view[self._position : self._position + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def open_input(source: ImageInput) -> Union[str, Path, BinaryIO]:
+    # Something Image.open reads without a temp file. A descriptor stays open for its owner;
+    # Pillow reads a non-seekable one (a pipe) into memory itself.
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return BufferReader(source)
+    if isinstance(source, int):
+        return open(source, "rb", closefd=False)
+    return source
+
+
+def is_path(source: ImageInput) -> bool:
+    return isinstance(source, (str, Path))
+
+
+def cover_box(width: int, height: int, target_width: int, target_height: int) -> Box:
+    scale = max(target_width / width, target_height / height)
+    resized_width = int(width * scale)
+    resized_height = int(height * scale)
+    left = (resized_width - target_width) // 2
+    top = (resized_height - target_height) // 2
+    return (
+        left / scale,
+        top / scale,
+        (left + target_width) / scale,
+        (top + target_height) / scale,
+    )
+
+
+def cover_resize(
+    image: Image.Image,
+    target_width: int,
+    target_height: int,
+    resample: int = Image.LANCZOS,
+    box_scale: Tuple[float, float] = (1.0, 1.0),
+    source_size: Optional[Tuple[int, int]] = None,
+) -> Image.Image:
+    width, height = source_size or image.size
+    left, top, right, bottom = cover_box(width, height, target_width, target_height)
+    sx, sy = box_scale
+    box = (left * sx, top * sy, min(right * sx, image.width), min(bottom * sy, image.height))
+    if image.mode not in RESAMPLE_MODES:
+        image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+    return image.resize((target_width, target_height), resample, box=box, reducing_gap=REDUCING_GAP)
+
+
+def pre_reduce(image: Image.Image, size: Tuple[int, int], resample: int, box: Box) -> Tuple[Image.Image, Box]:
+    # The integer pre-shrink resize(reducing_gap=REDUCING_GAP) would do, done once for all row blocks.
+    if resample == Image.NEAREST:
+        return image, box
+    factor_x = int((box[2] - box[0]) / size[0] / REDUCING_GAP) or 1
+    factor_y = int((box[3] - box[1]) / size[1] / REDUCING_GAP) or 1
+    if factor_x == 1 and factor_y == 1:
+        return image, box
+    support = FILTER_SUPPORT[resample] - 0.5
+    support_x = support * (box[2] - box[0]) / size[0]
+    support_y = support * (box[3] - box[1]) / size[1]
+    reduce_box = (
+        max(0, int(box[0] - support_x)),
+        max(0, int(box[1] - support_y)),
+        min(image.width, math.ceil(box[2] + support_x)),
+        min(image.height, math.ceil(box[3] + support_y)),
+    )
+    reduced = image.reduce((factor_x, factor_y), box=reduce_box)
+    return reduced, (
+        (box[0] - reduce_box[0]) / factor_x,
+        (box[1] - reduce_box[1]) / factor_y,
+        (box[2] - reduce_box[0]) / factor_x,
+        (box[3] - reduce_box[1]) / factor_y,
+    )
+
+
+@dataclass
+class CoverSource:
+    # A decoded source ready to be resampled to the canvas, any range of rows at a time.
+    image: Image.Image
+    box: Box
+    size: Tuple[int, int]
+    resample: int
+    source_size: Tuple[int, int]
+    decoded_size: Tuple[int, int]
+    # Bands shorter than a block are cut from the same block in turn; keep it until they move past it.
+    _last: Optional[Tuple[int, Image.Image]] = field(default=None, init=False, repr=False)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"source_size": list(self.source_size), "decoded_size": list(self.decoded_size)}
+
+    def block(self, top: int) -> Image.Image:
+        width, height = self.size
+        left, box_top, right, box_bottom = self.box
+        scale = (box_bottom - box_top) / height
+        bottom = min(top + RESAMPLE_BLOCK_ROWS, height)
+        block = self.image.resize(
+            (width, bottom - top),
+            self.resample,
+            box=(left, box_top + top * scale, right, box_top + bottom * scale),
+        )
+        return block if block.mode == "RGBA" else block.convert("RGBA")
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        first = top - top % RESAMPLE_BLOCK_ROWS
+        if first == top and bottom == min(top + RESAMPLE_BLOCK_ROWS, self.size[1]):
+            return self.block(top)
+        band = Image.new("RGBA", (self.size[0], bottom - top))
+        for block_top in range(first, bottom, RESAMPLE_BLOCK_ROWS):
+            if self._last is None or self._last[0] != block_top:
+                self._last = (block_top, self.block(block_top))
+            band.paste(self._last[1], (0, block_top - top))
+        return band
+
+
+def open_cover(
+    source: ImageInput,
+    target_width: int,
+    target_height: int,
+    profiler: Optional[RenderHook] = None,
+    resample: int = Image.LANCZOS,
+) -> CoverSource:
+    mark = profile_start(profiler)
+    with Image.open(open_input(source)) as image:
+        source_size = image.size
+        if image.format == "JPEG":
+            scale = max(target_width / image.width, target_height / image.height)
+            image.draft(
+                "RGB",
+                (
+                    math.ceil(image.width * scale * DRAFT_GAP),
+                    math.ceil(image.height * scale * DRAFT_GAP),
+                ),
+            )
+        image.load()
+        decoded_size = image.size
+        profile_end(profiler, mark, "decode", area=decoded_size[0] * decoded_size[1])
+        mark = profile_start(profiler)
+        width, height = source_size
+        left, top, right, bottom = cover_box(width, height, target_width, target_height)
+        sx, sy = decoded_size[0] / width, decoded_size[1] / height
+        box = (left * sx, top * sy, min(right * sx, image.width), min(bottom * sy, image.height))
+        if image.mode not in RESAMPLE_MODES:
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+        image, box = pre_reduce(image, (target_width, target_height), resample, box)
+        profile_end(profiler, mark, "crop", area=image.width * image.height)
+    return CoverSource(
+        image=image,
+        box=box,
+        size=(target_width, target_height),
+        resample=resample,
+        source_size=source_size,
+        decoded_size=decoded_size,
+    )
+
+
+def load_cover(
+    source: ImageInput,
+    target_width: int,
+    target_height: int,
+    profiler: Optional[RenderHook] = None,
+    resample: int = Image.LANCZOS,
+) -> DecodedSource:
+    cover = open_cover(source, target_width, target_height, profiler=profiler, resample=resample)
+    mark = profile_start(profiler)
+    base = cover.rows(0, target_height)
+    profile_end(profiler, mark, "crop", area=target_width * target_height)
+    return DecodedSource(image=base, source_size=cover.source_size, decoded_size=cover.decoded_size)
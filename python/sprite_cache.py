@@ -0,0 +1,123 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from python.cache import LRUCache
+from python.font_cache import Variation
+from python.overlay_cache import image_bytes
+from python.rect_effects import Color
+
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get("THUMBNAIL_SPRITE_CACHE_MB", 64)) * 1024 * 1024
+
+
+def blur_margin(blur: int) -> int:
+    # Pillow approximates a Gaussian with three box passes; each pass reaches at most blur + 1 pixels.
+    return 3 * (blur + 1) if blur > 0 else 0
+
+
+def blur_tile(tile: Image.Image, blur: int) -> Image.Image:
+    if blur <= 0:
+        return tile
+    return tile.filter(ImageFilter.GaussianBlur(blur))
+
+
+@dataclass(frozen=True, slots=True)
+class TextSprite:
+    # Same-sized tiles composited in order: the stroke pass, when there is one, then the fill.
+    images: Tuple[Image.Image, ...]
+    # From the text origin to the tiles' top-left corner.
+    offset: Tuple[int, int]
+    # Width of the unstroked text, which alignment is measured against.
+    width: int
+
+
+def sprite_bytes(sprite: TextSprite) -> int:
+    return sum(image_bytes(image) for image in sprite.images)
+
+
+def draw_sprite(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    fill: Color,
+    spacing: int,
+    align: str,
+    stroke_width: int = 0,
+    stroke_color: Optional[Color] = None,
+    blur: int = 0,
+) -> TextSprite:
+    # Glyph masks only depend on the origin's fractional part, so a run drawn at an integer
+    # origin here lands on the same pixels as drawing it straight onto the canvas.
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    bbox = measure.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+    ink = measure.multiline_textbbox((0, 0), text, font=font, spacing=spacing, align=align, stroke_width=stroke_width)
+    # Centred and right-aligned multiline boxes come back as floats.
+    margin = blur_margin(blur)
+    left, top = math.floor(ink[0]) - margin, math.floor(ink[1]) - margin
+    size = (math.ceil(ink[2]) + margin - left, math.ceil(ink[3]) + margin - top)
+
+    def draw_pass(color: Color, stroke: Color) -> Image.Image:
+        # Stroked lines are laid out further apart, so both passes keep stroke_width; a transparent
+        # stroke leaves the tile untouched.
+        tile = Image.new("RGBA", size, (0, 0, 0, 0))
+        ImageDraw.Draw(tile).multiline_text(
+            (-left, -top), text, font=font, fill=color, spacing=spacing, align=align, stroke_width=stroke_width, stroke_fill=stroke
+        )
+        return blur_tile(tile, blur)
+
+    # Pillow fills over the stroke where both are partly covered; one merged tile would blend those edges differently.
+    passes = []
+    if stroke_width and stroke_color not in (None, fill):
+        passes.append(draw_pass(stroke_color, stroke_color))
+        passes.append(draw_pass(fill, (0, 0, 0, 0)))
+    else:
+        passes.append(draw_pass(fill, fill))
+    return TextSprite(images=tuple(passes), offset=(left, top), width=int(bbox[2] - bbox[0]))
+
+
+class SpriteCache:
+    # Rasterized text runs, stroke included, and their blurred shadows. Tags, series names and
+    # handles repeat across thousands of renders; a hit is one alpha_composite.
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET_BYTES) -> None:
+        self._sprites = LRUCache(max_bytes=max_bytes, sizeof=sprite_bytes)
+
+    def text(
+        self,
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        variation: Variation,
+        fill: Color,
+        spacing: int,
+        align: str,
+        stroke_width: int = 0,
+        stroke_color: Optional[Color] = None,
+    ) -> TextSprite:
+        key = ("text", text, font.path, font.size, variation, fill, stroke_width, stroke_color, spacing, align)
+        return self._sprites.get_or_create(
+            key, lambda: draw_sprite(text, font, fill, spacing, align, stroke_width, stroke_color)
+        )
+
+    def shadow(
+        self,
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        variation: Variation,
+        color: Color,
+        spacing: int,
+        align: str,
+        blur: int,
+    ) -> TextSprite:
+        key = ("shadow", text, font.path, font.size, variation, color, spacing, align, blur)
+        return self._sprites.get_or_create(key, lambda: draw_sprite(text, font, color, spacing, align, blur=blur))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._sprites.stats()
+
+    def clear(self) -> None:
+        self._sprites.clear()
+
+
+SPRITES = SpriteCache()
@@ -0,0 +1,384 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ClassVar, Dict, Optional, Tuple, Union
+
+from PIL import ImageColor, ImageFont
+
+from python.font_cache import FONTS, Variation
+from python.overlay_cache import OVERLAYS
+from python.rect_effects import Color, ColorStop, np
+
+PLACEHOLDER_RE = re.compile(r"\{\{\s*([a-zA-Z0-9_\-]+)\s*\}\}")
+
+# Pillow's WebP encoder tops out at 16383; nothing larger is useful as a thumbnail or banner.
+MAX_CANVAS_SIDE = 16383
+
+TEXT_ALIGNS = ("left", "center", "right")
+GRADIENT_KINDS = ("linear", "radial")
+
+
+@dataclass
+class CanvasSpec:
+    width: int
+    height: int
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def resolve_color(color: str, opacity: float | None = None) -> Tuple[int, int, int, int]:
+    if not isinstance(color, str) or not color.startswith("#"):
+        raise TemplateError(f"Color must be hex string like #RRGGBB: {color}")
+    hex_value = color.lstrip("#")
+    if len(hex_value) != 6:
+        raise TemplateError(f"Color must be 6-digit hex: {color}")
+    r = int(hex_value[0:2], 16)
+    g = int(hex_value[2:4], 16)
+    b = int(hex_value[4:6], 16)
+    alpha = 255
+    if opacity is not None:
+        alpha = int(max(0, min(1, opacity)) * 255)
+    return (r, g, b, alpha)
+
+
+def ink_color(color: Any) -> Color:
+    # Text inks accept anything Pillow does (names, #RGB, rgb()); resolved here exactly as ImageDraw would.
+    try:
+        return ImageColor.getcolor(color, "RGBA")
+    except (AttributeError, ValueError) as exc:
+        raise TemplateError(f"Unknown text color: {color}") from exc
+
+
+def load_font(font_path: str, size: int, variation: Variation = None) -> ImageFont.FreeTypeFont:
+    path = Path(font_path)
+    if not path.exists():
+        raise TemplateError(f"Font not found: {font_path}")
+    try:
+        return FONTS.get(str(path), size, variation)
+    except Exception as exc:
+        raise TemplateError(f"Unable to load font {font_path}: {exc}") from exc
+
+
+def anchor_point(anchor: str, canvas: CanvasSpec) -> Tuple[int, int]:
+    anchors = {
+        "top_left": (0, 0),
+        "top_center": (canvas.width // 2, 0),
+        "top_right": (canvas.width, 0),
+        "center_left": (0, canvas.height // 2),
+        "center": (canvas.width // 2, canvas.height // 2),
+        "center_right": (canvas.width, canvas.height // 2),
+        "bottom_left": (0, canvas.height),
+        "bottom_center": (canvas.width // 2, canvas.height),
+        "bottom_right": (canvas.width, canvas.height),
+    }
+    if anchor not in anchors:
+        raise TemplateError(f"Unknown anchor '{anchor}'")
+    return anchors[anchor]
+
+
+def position_from_anchor(anchor: str, position: Dict[str, int], canvas: CanvasSpec) -> Tuple[int, int]:
+    base_x, base_y = anchor_point(anchor, canvas)
+    x = base_x + int(position.get("x", 0))
+    y = base_y + int(position.get("y", 0))
+    return x, y
+
+
+def validate_template(template: Dict[str, Any]) -> CanvasSpec:
+    if "canvas" not in template:
+        raise TemplateError("Template missing canvas")
+    canvas = template["canvas"]
+    try:
+        width = int(canvas["width"])
+        height = int(canvas["height"])
+    except Exception as exc:
+        raise TemplateError("Canvas width/height must be integers") from exc
+    if width <= 0 or height <= 0:
+        raise TemplateError("Canvas width/height must be positive")
+    if width > MAX_CANVAS_SIDE or height > MAX_CANVAS_SIDE:
+        raise TemplateError(f"Canvas width/height must be at most {MAX_CANVAS_SIDE}")
+    if "layers" not in template or not isinstance(template["layers"], list):
+        raise TemplateError("Template missing layers list")
+    return CanvasSpec(width=width, height=height)
+
+
+# The compiled form of a template: one frozen, slotted object per layer with colours resolved,
+# anchors turned into canvas coordinates, text split at its placeholders and assets checked.
+# Nothing in it is parsed again at render time.
+
+
+@dataclass(frozen=True, slots=True)
+class TextPattern:
+    source: str
+    # Literal text and placeholder names, alternating: literal, name, literal, ...
+    parts: Tuple[str, ...]
+
+    @classmethod
+    def parse(cls, text: str) -> "TextPattern":
+        return cls(source=text, parts=tuple(PLACEHOLDER_RE.split(text)))
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self.parts[1::2]
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        if len(self.parts) == 1:
+            return self.parts[0]
+        parts = list(self.parts)
+        for index in range(1, len(parts), 2):
+            key = parts[index]
+            if key not in variables:
+                raise TemplateError(f"Missing variable '{key}' for text '{self.source}'")
+            parts[index] = str(variables[key])
+        return "".join(parts)
+
+
+@dataclass(frozen=True, slots=True)
+class Shadow:
+    color: Color
+    blur: int
+    offset: Tuple[int, int]
+    # Panels keep their hard-edged shadow unless the template asks for a Gaussian falloff.
+    soft: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Gradient:
+    kind: str
+    stops: Tuple[ColorStop, ...]
+    angle: float = 0.0
+    center: Tuple[float, float] = (0.5, 0.5)
+    radius: float = 0.5
+
+
+@dataclass(frozen=True, slots=True)
+class PanelLayer:
+    kind: ClassVar[str] = "panel"
+    name: Optional[str]
+    position: Tuple[int, int]
+    size: Tuple[int, int]
+    color: Color
+    gradient: Optional[Gradient]
+    shadow: Optional[Shadow]
+
+
+@dataclass(frozen=True, slots=True)
+class TextFit:
+    max_width: float
+    max_height: Optional[float]
+    max_lines: Optional[int]
+    min_size: int
+    max_size: int
+
+
+@dataclass(frozen=True, slots=True)
+class TextLayer:
+    kind: ClassVar[str] = "text"
+    name: Optional[str]
+    pattern: TextPattern
+    # Anchor, position and padding combined: where the text block starts before alignment.
+    origin: Tuple[int, int]
+    font: ImageFont.FreeTypeFont
+    font_path: str
+    variation: Variation
+    fill: Color
+    stroke_color: Color
+    stroke_width: int
+    spacing: int
+    align: str
+    shadow: Optional[Shadow]
+    fit: Optional[TextFit]
+
+
+@dataclass(frozen=True, slots=True)
+class OverlayLayer:
+    kind: ClassVar[str] = "overlay"
+    name: Optional[str]
+    path: str
+    position: Tuple[int, int]
+    size: Optional[Tuple[int, int]]
+    opacity: float
+
+
+@dataclass(frozen=True, slots=True)
+class DividerLayer:
+    kind: ClassVar[str] = "divider"
+    name: Optional[str]
+    center: int
+    width: int
+    color: Color
+    blur: int
+    soft: bool = False
+
+
+Layer = Union[PanelLayer, TextLayer, OverlayLayer, DividerLayer]
+
+
+def compile_shadow(shadow: Optional[Dict[str, Any]]) -> Optional[Shadow]:
+    if not shadow:
+        return None
+    offset = shadow.get("offset", {"x": 0, "y": 0})
+    return Shadow(
+        color=resolve_color(shadow.get("color", "#000000"), shadow.get("opacity", 0.5)),
+        blur=int(shadow.get("blur", 0)),
+        offset=(int(offset.get("x", 0)), int(offset.get("y", 0))),
+        soft=bool(shadow.get("soft", False)),
+    )
+
+
+def compile_gradient(layer: Dict[str, Any], fill: Dict[str, Any]) -> Gradient:
+    gradient = fill["gradient"]
+    if np is None:
+        raise TemplateError("Gradient fills need numpy (pip install numpy)")
+    kind = gradient.get("type", "linear")
+    if kind not in GRADIENT_KINDS:
+        raise TemplateError(f"Unknown gradient type '{kind}'")
+    stops = tuple(
+        (
+            float(stop.get("offset", 0)),
+            resolve_color(stop.get("color", "#000000"), stop.get("opacity", fill.get("opacity", 1.0))),
+        )
+        for stop in gradient.get("stops", [])
+    )
+    if len(stops) < 2:
+        raise TemplateError(f"Panel layer '{layer.get('name')}' gradient needs at least two stops")
+    center = gradient.get("center", {})
+    return Gradient(
+        kind=kind,
+        stops=stops,
+        angle=float(gradient.get("angle", 0)),
+        center=(float(center.get("x", 0.5)), float(center.get("y", 0.5))),
+        radius=float(gradient.get("radius", 0.5)),
+    )
+
+
+def compile_panel(layer: Dict[str, Any], canvas: CanvasSpec) -> PanelLayer:
+    size = layer.get("size")
+    if not size:
+        raise TemplateError(f"Panel layer '{layer.get('name')}' missing size")
+    fill = layer.get("fill", {})
+    return PanelLayer(
+        name=layer.get("name"),
+        position=position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas),
+        size=(int(size.get("width")), int(size.get("height"))),
+        color=resolve_color(fill.get("color", "#000000"), fill.get("opacity", 1.0)),
+        gradient=compile_gradient(layer, fill) if fill.get("gradient") else None,
+        shadow=compile_shadow(layer.get("shadow")),
+    )
+
+
+def compile_fit(layer: Dict[str, Any], size: int) -> Optional[TextFit]:
+    fit = layer.get("fit")
+    if not fit:
+        return None
+    if not fit.get("max_width"):
+        raise TemplateError(f"Text layer '{layer.get('name')}' fit needs max_width")
+    return TextFit(
+        max_width=float(fit["max_width"]),
+        max_height=float(fit["max_height"]) if fit.get("max_height") else None,
+        max_lines=int(fit["max_lines"]) if fit.get("max_lines") else None,
+        min_size=int(fit.get("min_size", min(12, size))),
+        max_size=int(fit.get("max_size", size)),
+    )
+
+
+def compile_text(layer: Dict[str, Any], canvas: CanvasSpec) -> TextLayer:
+    font_spec = layer.get("font")
+    if not font_spec:
+        raise TemplateError(f"Text layer '{layer.get('name')}' missing font")
+    size = int(font_spec.get("size"))
+    variation = font_spec.get("variation")
+    if isinstance(variation, list):
+        variation = tuple(variation)
+    align = layer.get("align", "left")
+    if align not in TEXT_ALIGNS:
+        raise TemplateError(f"Text layer '{layer.get('name')}' align must be one of {', '.join(TEXT_ALIGNS)}")
+    x, y = position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas)
+    padding = layer.get("padding", {"x": 0, "y": 0})
+    stroke = layer.get("stroke", {})
+    return TextLayer(
+        name=layer.get("name"),
+        pattern=TextPattern.parse(str(layer.get("text", ""))),
+        origin=(x + int(padding.get("x", 0)), y + int(padding.get("y", 0))),
+        font=load_font(font_spec.get("path"), size, variation),
+        font_path=str(font_spec.get("path")),
+        variation=variation,
+        fill=ink_color(layer.get("fill", "#FFFFFF")),
+        stroke_color=ink_color(stroke.get("color", "#000000")),
+        stroke_width=int(stroke.get("width", 0)),
+        spacing=int(layer.get("line_spacing", 0)),
+        align=align,
+        shadow=compile_shadow(layer.get("shadow")),
+        fit=compile_fit(layer, size),
+    )
+
+
+def compile_overlay(layer: Dict[str, Any], canvas: CanvasSpec) -> OverlayLayer:
+    path = layer.get("path")
+    if not path:
+        raise TemplateError(f"Overlay layer '{layer.get('name')}' missing path")
+    size = layer.get("size")
+    compiled = OverlayLayer(
+        name=layer.get("name"),
+        path=str(path),
+        position=position_from_anchor(layer.get("anchor", "top_left"), layer.get("position", {}), canvas),
+        size=(int(size.get("width")), int(size.get("height"))) if size else None,
+        opacity=float(layer.get("opacity", 1.0)),
+    )
+    # Decoding here also warms the overlay cache for the first render.
+    try:
+        OVERLAYS.get(compiled.path, compiled.size, compiled.opacity)
+    except FileNotFoundError as exc:
+        raise TemplateError(f"Overlay not found: {path}") from exc
+    except OSError as exc:
+        raise TemplateError(f"Unable to load overlay {path}: {exc}") from exc
+    return compiled
+
+
+def compile_divider(layer: Dict[str, Any], canvas: CanvasSpec) -> DividerLayer:
+    return DividerLayer(
+        name=layer.get("name"),
+        center=int(layer.get("position", canvas.width // 2)),
+        width=int(layer.get("width", 4)),
+        color=resolve_color(layer.get("color", "#FFFFFF"), layer.get("opacity", 1.0)),
+        blur=int(layer.get("blur", 0)),
+        soft=bool(layer.get("soft", False)),
+    )
+
+
+LAYER_COMPILERS = {
+    "panel": compile_panel,
+    "text": compile_text,
+    "overlay": compile_overlay,
+    "divider": compile_divider,
+}
+
+
+def compile_layer(layer: Dict[str, Any], canvas: CanvasSpec) -> Layer:
+    if not isinstance(layer, dict):
+        raise TemplateError("Each layer must be a JSON object")
+    layer_type = layer.get("type")
+    if layer_type not in LAYER_COMPILERS:
+        raise TemplateError(f"Unknown layer type '{layer_type}'")
+    try:
+        return LAYER_COMPILERS[layer_type](layer, canvas)
+    except TemplateError:
+        raise
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        raise TemplateError(f"Invalid {layer_type} layer '{layer.get('name')}': {exc}") from exc
+
+
+def compile_layers(template: Dict[str, Any], canvas: CanvasSpec) -> Tuple[Layer, ...]:
+    return tuple(compile_layer(layer, canvas) for layer in template["layers"])
+
+
+def layer_assets(layers: Tuple[Layer, ...]) -> Tuple[str, ...]:
+    # Files a compiled template depends on besides its JSON: every font and overlay it references.
+    paths = []
+    for layer in layers:
+        if isinstance(layer, TextLayer):
+            paths.append(layer.font_path)
+        elif isinstance(layer, OverlayLayer):
+            paths.append(layer.path)
+    return tuple(dict.fromkeys(paths))
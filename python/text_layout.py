@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from python.cache import LRUCache
+from python.font_cache import Variation
+
+# Word advances per (font file, size, variation, word); shared by every render in the process.
+ADVANCES = LRUCache(max_entries=65536)
+
+_MEASURE_DRAW = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+
+def font_key(font: Any, variation: Variation = None) -> Optional[Hashable]:
+    path = getattr(font, "path", None)
+    if not path:
+        return None
+    if variation is not None and not isinstance(variation, str):
+        variation = tuple(float(value) for value in variation)
+    return (str(path), getattr(font, "size", None), variation)
+
+
+def advance(font: Any, text: str, key: Optional[Hashable] = None) -> float:
+    if key is None:
+        return font.getlength(text)
+    return ADVANCES.get_or_create((key, text), lambda: font.getlength(text))
+
+
+def wrap_lines(text: str, font: Any, max_width: float, variation: Variation = None) -> List[str]:
+    # Greedy wrap in one pass: each distinct word is measured once per font, lines are summed.
+    key = font_key(font, variation)
+    space = advance(font, " ", key)
+    lines: List[str] = []
+    for paragraph in text.split("\n"):
+        current: List[str] = []
+        width = 0.0
+        for word in paragraph.split():
+            word_width = advance(font, word, key)
+            if current and width + space + word_width > max_width:
+                lines.append(" ".join(current))
+                current, width = [word], word_width
+            else:
+                width = width + space + word_width if current else word_width
+                current.append(word)
+        lines.append(" ".join(current))
+    return lines
+
+
+def wrap_text(text: str, font: Any, max_width: float, variation: Variation = None) -> str:
+    return "\n".join(wrap_lines(text, font, max_width, variation))
+
+
+def block_size(text: str, font: Any, spacing: int = 4, stroke_width: int = 0, align: str = "left") -> Tuple[int, int]:
+    left, top, right, bottom = _MEASURE_DRAW.multiline_textbbox(
+        (0, 0), text, font=font, spacing=spacing, align=align, stroke_width=stroke_width
+    )
+    return right - left, bottom - top
+
+
+@dataclass
+class FitResult:
+    font: Any
+    size: int
+    text: str
+    fits: bool
+
+
+def fit_text(
+    text: str,
+    load: Callable[[int], Any],
+    max_width: float,
+    max_height: Optional[float] = None,
+    max_lines: Optional[int] = None,
+    min_size: int = 8,
+    max_size: int = 72,
+    spacing: int = 4,
+    stroke_width: int = 0,
+    variation: Variation = None,
+) -> FitResult:
+    # Binary search for the largest size whose wrapped block fits; falls back to min_size.
+    def attempt(size: int) -> Tuple[bool, Any, str]:
+        font = load(size)
+        lines = wrap_lines(text, font, max(max_width - 2 * stroke_width, 1), variation)
+        if max_lines is not None and len(lines) > max_lines:
+            return False, font, "\n".join(lines)
+        wrapped = "\n".join(lines)
+        width, height = block_size(wrapped, font, spacing, stroke_width)
+        fits = width <= max_width and (max_height is None or height <= max_height)
+        return fits, font, wrapped
+
+    low, high = min(min_size, max_size), max_size
+    best: Optional[FitResult] = None
+    while low <= high:
+        size = (low + high) // 2
+        fits, font, wrapped = attempt(size)
+        if fits:
+            best = FitResult(font=font, size=size, text=wrapped, fits=True)
+            low = size + 1
+        else:
+            high = size - 1
+    if best is not None:
+        return best
+    size = min(min_size, max_size)
+    _fits, font, wrapped = attempt(size)
+    return FitResult(font=font, size=size, text=wrapped, fits=False)
@@ -11,9 +11,14 @@ const PORT = process.env.PORT || 3000;
 
 const publicDir = path.join(__dirname, "public");
 const outputDir = path.join(publicDir, "output");
-const uploadDir = path.join(publicDir, "uploads");
+const renderCacheDir = path.join(outputDir, "cache");
+const previewScale = Number(process.env.THUMBNAIL_PREVIEW_SCALE) || 0.25;
+const uploadCacheBytes = (Number(process.env.THUMBNAIL_UPLOAD_CACHE_MB) || 256) * 1024 * 1024;
+const uploadMaxBytes = (Number(process.env.THUMBNAIL_UPLOAD_MAX_MB) || 50) * 1024 * 1024;
+const renderTimeoutMs = Number(process.env.THUMBNAIL_RENDER_TIMEOUT_MS) || 60000;
+const maxPendingRenders = Number(process.env.THUMBNAIL_MAX_PENDING) || 64;
 
-for (const dir of [publicDir, outputDir, uploadDir]) {
+for (const dir of [publicDir, outputDir]) {
   if (!fs.existsSync(dir)) {
     fs.mkdirSync(dir, { recursive: true });
   }
@@ -25,16 +30,198 @@ app.use(express.static(publicDir));
 app.use(express.urlencoded({ extended: true }));
 app.use(express.json());
 
-const storage = multer.diskStorage({
-  destination: (_req, _file, cb) => cb(null, uploadDir),
-  filename: (_req, file, cb) => {
-    const ext = path.extname(file.originalname || ".jpg");
-    const name = `${crypto.randomUUID()}${ext}`;
-    cb(null, name);
-  }
+// Uploads stay in memory and go to the renderer over its stdin, so nothing is written to disk.
+// The cap keeps one oversized request from holding the whole upload in memory.
+const upload = multer({
+  storage: multer.memoryStorage(),
+  limits: { fileSize: uploadMaxBytes, files: 1 }
 });
 
-const upload = multer({ storage });
+function uploadImage(req, res, next) {
+  upload.single("image")(req, res, (error) => {
+    if (!error) {
+      return next();
+    }
+    if (error.code === "LIMIT_FILE_SIZE") {
+      return res.status(413).json({ error: `Image upload exceeds ${uploadMaxBytes / (1024 * 1024)} MB.` });
+    }
+    if (error instanceof multer.MulterError) {
+      return res.status(400).json({ error: error.message });
+    }
+    return next(error);
+  });
+}
+
+// Recent uploads by id, so previews can re-render without the image being re-sent.
+// The least recently used ones are dropped once the byte budget is exceeded.
+function createUploadStore(maxBytes) {
+  const entries = new Map();
+  let total = 0;
+
+  return {
+    add(buffer) {
+      const id = crypto.randomUUID();
+      entries.set(id, buffer);
+      total += buffer.length;
+      for (const [oldId, oldBuffer] of entries) {
+        if (total <= maxBytes || oldId === id) {
+          break;
+        }
+        entries.delete(oldId);
+        total -= oldBuffer.length;
+      }
+      return id;
+    },
+    get(id) {
+      const buffer = entries.get(id);
+      if (buffer) {
+        entries.delete(id);
+        entries.set(id, buffer);
+      }
+      return buffer;
+    }
+  };
+}
+
+const uploads = createUploadStore(uploadCacheBytes);
+
+function workerError(message, status) {
+  const error = new Error(message);
+  error.status = status;
+  return error;
+}
+
+// A job that does not answer within timeoutMs is rejected and the worker is restarted, which also
+// fails the other jobs it was running. Beyond maxPending unanswered jobs, new ones are refused.
+function createThumbnailWorker({ timeoutMs, maxPending }) {
+  let child = null;
+
+  function start() {
+    const args = [path.join(__dirname, "python", "generate_thumbnail.py"), "--serve"];
+    if (process.env.THUMBNAIL_WORKERS) {
+      args.push("--workers", process.env.THUMBNAIL_WORKERS);
+    }
+    if (process.env.THUMBNAIL_QUEUE_SIZE) {
+      args.push("--queue-size", process.env.THUMBNAIL_QUEUE_SIZE);
+    }
+
+    const proc = spawn("python3", args);
+    const pending = new Map();
+    let stderr = "";
+    let stopReason = null;
+
+    function settle(response, image) {
+      const job = pending.get(response.id);
+      if (!job) {
+        return;
+      }
+      pending.delete(response.id);
+      if (response.error) {
+        job.reject(new Error(response.error));
+      } else {
+        job.resolve({ ...response, image });
+      }
+    }
+
+    // Each response is a JSON line, followed by "output_bytes" raw bytes when the image is returned in memory.
+    let buffered = Buffer.alloc(0);
+    let header = null;
+    proc.stdout.on("data", (chunk) => {
+      buffered = buffered.length ? Buffer.concat([buffered, chunk]) : chunk;
+      for (;;) {
+        if (!header) {
+          const newline = buffered.indexOf(10);
+          if (newline < 0) {
+            return;
+          }
+          const line = buffered.subarray(0, newline).toString();
+          buffered = buffered.subarray(newline + 1);
+          try {
+            header = JSON.parse(line);
+          } catch (error) {
+            console.error("Invalid response from image generator", line);
+            continue;
+          }
+        }
+        const size = header.output_bytes || 0;
+        if (buffered.length < size) {
+          return;
+        }
+        const image = size ? buffered.subarray(0, size) : null;
+        buffered = buffered.subarray(size);
+        const response = header;
+        header = null;
+        settle(response, image);
+      }
+    });
+
+    proc.stdin.on("error", (error) => {
+      console.error("Image generator stdin closed", error.message);
+    });
+
+    proc.stderr.on("data", (data) => {
+      stderr = (stderr + data.toString()).slice(-4000);
+    });
+
+    proc.on("close", (code) => {
+      if (child && child.proc === proc) {
+        child = null;
+      }
+      const error = new Error(stopReason || stderr || `Image generator exited with code ${code}.`);
+      for (const job of pending.values()) {
+        job.reject(error);
+      }
+      pending.clear();
+    });
+
+    return {
+      proc,
+      pending,
+      stop(reason) {
+        stopReason = reason;
+        if (child && child.proc === proc) {
+          child = null;
+        }
+        proc.kill();
+      }
+    };
+  }
+
+  return {
+    // image is the encoded source; it follows the job line as "image_bytes" raw bytes.
+    render(payload, image) {
+      if (child && child.pending.size >= maxPending) {
+        return Promise.reject(workerError("Image generator is busy, try again shortly.", 503));
+      }
+      if (!child) {
+        child = start();
+      }
+      const worker = child;
+      const id = crypto.randomUUID();
+      return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+          worker.pending.delete(id);
+          reject(workerError(`Image generator did not answer within ${timeoutMs} ms.`, 504));
+          worker.stop("Image generator was restarted after a job timed out.");
+        }, timeoutMs);
+        worker.pending.set(id, {
+          resolve(response) {
+            clearTimeout(timer);
+            resolve(response);
+          },
+          reject(error) {
+            clearTimeout(timer);
+            reject(error);
+          }
+        });
+        worker.proc.stdin.write(`${JSON.stringify({ ...payload, id, image_bytes: image.length })}\n`);
+        worker.proc.stdin.write(image);
+      });
+    }
+  };
+}
+
+const thumbnailWorker = createThumbnailWorker({ timeoutMs: renderTimeoutMs, maxPending: maxPendingRenders });
 
 app.get("/", (_req, res) => {
   res.redirect("/edit");
@@ -122,85 +309,105 @@ app.post("/api/json-templates", async (req, res) => {
   return res.json(created);
 });
 
-app.post("/generate", upload.single("image"), async (req, res) => {
-  try {
-    if (!req.file) {
-      return res.status(400).json({ error: "Image upload is required." });
-    }
+function thumbnailPayload(body) {
+  const {
+    main_title,
+    left_caption,
+    right_caption,
+    primary_color,
+    font_size,
+    font_family,
+    font_style,
+    banner_height,
+    panel_height,
+    panel_margin,
+    panel_padding,
+    panel_gap,
+    divider_width,
+    divider_opacity
+  } = body;
 
-    const {
-      main_title,
-      left_caption,
-      right_caption,
-      primary_color,
-      font_size,
-      font_family,
-      font_style,
-      banner_height,
-      panel_height,
-      panel_margin,
-      panel_padding,
-      panel_gap,
-      divider_width,
-      divider_opacity
-    } = req.body;
-
-    const outputFile = `${crypto.randomUUID()}.jpg`;
-    const outputPath = path.join(outputDir, outputFile);
+  return {
+    profile: process.env.THUMBNAIL_PROFILE === "1" || undefined,
+    main_title,
+    left_caption,
+    right_caption,
+    primary_color,
+    font_size: Number(font_size),
+    font_family,
+    font_style,
+    banner_height: Number(banner_height),
+    panel_height: Number(panel_height),
+    panel_margin: Number(panel_margin),
+    panel_padding: Number(panel_padding),
+    panel_gap: Number(panel_gap),
+    divider_width: Number(divider_width),
+    divider_opacity: Number(divider_opacity)
+  };
+}
 
-    const payload = {
-      image_path: req.file.path,
-      output_path: outputPath,
-      main_title,
-      left_caption,
-      right_caption,
-      primary_color,
-      font_size: Number(font_size),
-      font_family,
-      font_style,
-      banner_height: Number(banner_height),
-      panel_height: Number(panel_height),
-      panel_margin: Number(panel_margin),
-      panel_padding: Number(panel_padding),
-      panel_gap: Number(panel_gap),
-      divider_width: Number(divider_width),
-      divider_opacity: Number(divider_opacity)
-    };
+// Previews re-use the last upload by id so typing does not re-send the image.
+function uploadedImage(req) {
+  if (req.file) {
+    return { id: uploads.add(req.file.buffer), buffer: req.file.buffer };
+  }
+  const id = req.body.image_id;
+  const buffer = id ? uploads.get(id) : null;
+  return buffer ? { id, buffer } : null;
+}
 
-    const pythonProcess = spawn("python3", [
-      path.join(__dirname, "python", "generate_thumbnail.py")
-    ]);
+function sendImage(res, image, response) {
+  res.set("X-Image-Id", image.id);
+  if (response.cache) {
+    res.set("X-Render-Cache", response.cache);
+  }
+  res.set("Cache-Control", "no-store");
+  return res.type("image/jpeg").send(response.image);
+}
 
-    let stdout = "";
-    let stderr = "";
+function logTimings(label, response) {
+  if (response.timings) {
+    const { total_ms: totalMs, stages } = response.timings;
+    console.log(`Rendered ${label} in ${totalMs.toFixed(1)} ms`, stages);
+  }
+}
 
-    pythonProcess.stdout.on("data", (data) => {
-      stdout += data.toString();
-    });
+app.post("/generate", uploadImage, async (req, res) => {
+  try {
+    const image = uploadedImage(req);
+    if (!image) {
+      return res.status(400).json({ error: "Image upload is required." });
+    }
 
-    pythonProcess.stderr.on("data", (data) => {
-      stderr += data.toString();
-    });
+    const payload = {
+      ...thumbnailPayload(req.body),
+      cache_dir: process.env.THUMBNAIL_RENDER_CACHE === "0" ? undefined : renderCacheDir
+    };
 
-    pythonProcess.on("close", (code) => {
-      if (code !== 0) {
-        return res.status(500).json({ error: stderr || "Image generation failed." });
-      }
+    const response = await thumbnailWorker.render(payload, image.buffer);
+    logTimings(`generate ${image.id}`, response);
+    return sendImage(res, image, response);
+  } catch (error) {
+    res.status(error.status || 500).json({ error: error.message });
+  }
+});
 
-      try {
-        const response = JSON.parse(stdout);
-        return res.json({
-          output: `/output/${path.basename(response.output_path)}`
-        });
-      } catch (error) {
-        return res.status(500).json({ error: "Invalid response from image generator." });
-      }
-    });
+app.post("/preview", uploadImage, async (req, res) => {
+  try {
+    const image = uploadedImage(req);
+    if (!image) {
+      return res.status(400).json({ error: "Image upload is required." });
+    }
 
-    pythonProcess.stdin.write(JSON.stringify(payload));
-    pythonProcess.stdin.end();
+    const scale = Math.min(Math.max(Number(req.body.preview_scale) || previewScale, 0.1), 1);
+    const response = await thumbnailWorker.render(
+      { ...thumbnailPayload(req.body), preview_scale: scale },
+      image.buffer
+    );
+    logTimings(`preview ${image.id}`, response);
+    return sendImage(res, image, response);
   } catch (error) {
-    res.status(500).json({ error: error.message });
+    res.status(error.status || 500).json({ error: error.message });
   }
 });
 
@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from python import make_sample_assets
+
+TEMPLATES = ROOT / "assets" / "templates"
+BUNDLED = ("split_screen_classic", "vram_tax", "announcement_spotlight")
+FONTS = [ROOT / "assets" / "fonts" / name for name in ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def sample_assets():
+    # Templates refer to fonts and overlays relative to the repository root. Fonts are supplied
+    # locally (see the README); the sample base and overlays are generated when missing.
+    if not all(path.exists() for path in FONTS):
+        pytest.skip("DejaVu fonts are not installed under assets/fonts")
+    previous = os.getcwd()
+    os.chdir(ROOT)
+    base = TEMPLATES / "sample_base.jpg"
+    if not base.exists() or not (make_sample_assets.OVERLAYS / "arrow_red.png").exists():
+        make_sample_assets.main()
+    yield base
+    os.chdir(previous)
+
+
+def template_path(name):
+    return TEMPLATES / f"{name}.json"
+
+
+def template_vars(name):
+    return json.loads((TEMPLATES / f"vars_{name}.json").read_text())
+
+
+def soft_template(name, directory):
+    # The same layout with Gaussian panel shadows and dividers, whose halos cross band edges.
+    template = json.loads(template_path(name).read_text())
+    for layer in template["layers"]:
+        if layer.get("shadow") and layer.get("type") == "panel":
+            layer["shadow"]["soft"] = True
+        if layer.get("type") == "divider":
+            layer["soft"] = True
+    path = directory / f"{name}_soft.json"
+    path.write_text(json.dumps(template))
+    return path
+
+
+def pixels(image):
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    return np.asarray(image.convert("RGBA"))
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from conftest import BUNDLED, pixels, soft_template, template_path, template_vars
+from python.render_thumbnail import render_thumbnail
+
+
+# About 34 rows at 1280 wide, which cuts each resample block into several bands, and about 256.
+BUDGETS = [1 << 20, 8 << 20]
+
+
+@pytest.mark.parametrize("soft", [False, True])
+@pytest.mark.parametrize("name", BUNDLED)
+def test_banded_render_matches_full_render(name, soft, tmp_path, sample_assets):
+    template = soft_template(name, tmp_path) if soft else template_path(name)
+    variables = template_vars(name)
+    render_thumbnail(sample_assets, template, variables, tmp_path / "full.png")
+    expected = pixels(tmp_path / "full.png")
+    for budget in BUDGETS:
+        result = render_thumbnail(sample_assets, template, variables, tmp_path / "banded.png", memory_budget=budget)
+        assert result["band_rows"] < expected.shape[0]
+        # PNG bytes differ between the two encoders; the pixels must not.
+        assert np.array_equal(pixels(tmp_path / "banded.png"), expected), budget
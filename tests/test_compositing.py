@@ -0,0 +1,75 @@
+import dataclasses
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from conftest import BUNDLED, pixels, template_path, template_vars
+from python.render_thumbnail import apply_layers, composite_tile, fit_layer_text, load_compiled_template, load_source
+from python.sprite_cache import SPRITES
+from python.template_ir import TextLayer
+
+
+def noise_tile(width, height, seed):
+    rng = random.Random(seed)
+    return Image.frombytes("RGBA", (width, height), rng.randbytes(width * height * 4))
+
+
+@pytest.mark.parametrize("position", [(10, 20), (-30, -15), (150, 90), (-5, 70), (300, 300)])
+@pytest.mark.parametrize("top", [0, 37])
+def test_clipped_tile_matches_full_canvas_layer(position, top):
+    canvas = noise_tile(200, 120, 1)
+    tile = noise_tile(80, 60, 2)
+
+    layer = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+    layer.paste(tile, position)
+    expected = Image.alpha_composite(canvas, layer).crop((0, top, canvas.width, canvas.height))
+
+    band = canvas.crop((0, top, canvas.width, canvas.height))
+    composite_tile(band, tile, position, top)
+    assert np.array_equal(pixels(band), pixels(expected))
+
+
+def draw_direct(base, layer, variables):
+    # Text drawn straight onto the canvas, as before sprites were cached.
+    text = layer.pattern.render(variables)
+    font = layer.font
+    if layer.fit:
+        font, text = fit_layer_text(layer, text)
+    draw = ImageDraw.Draw(base)
+    bbox = draw.multiline_textbbox((0, 0), text, font=font, spacing=layer.spacing)
+    x, y = layer.origin
+    if layer.align == "center":
+        x -= (bbox[2] - bbox[0]) // 2
+    elif layer.align == "right":
+        x -= bbox[2] - bbox[0]
+    draw.multiline_text(
+        (x, y),
+        text,
+        font=font,
+        fill=layer.fill,
+        spacing=layer.spacing,
+        align=layer.align,
+        stroke_width=layer.stroke_width,
+        stroke_fill=layer.stroke_color,
+    )
+
+
+@pytest.mark.parametrize("name", BUNDLED)
+def test_sprite_text_matches_direct_draw(name, sample_assets):
+    compiled = load_compiled_template(template_path(name), flatten=False)
+    variables = template_vars(name)
+    base = load_source(sample_assets, compiled.template, compiled.canvas).image
+    SPRITES.clear()
+
+    layers = [dataclasses.replace(layer, shadow=None) for layer in compiled.layers if isinstance(layer, TextLayer)]
+    assert layers
+    for layer in layers:
+        expected = base.copy()
+        draw_direct(expected, layer, variables)
+        # The second pass composites the cached sprite.
+        for _ in range(2):
+            cached = base.copy()
+            apply_layers(cached, [layer], compiled.canvas, variables)
+            assert np.array_equal(pixels(cached), pixels(expected)), layer.name
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from conftest import BUNDLED, pixels, soft_template, template_path, template_vars
+from python.render_thumbnail import _COMPILED_TEMPLATES, compose_compiled, load_compiled_template, load_source
+
+
+def render(template, variables, base_path, threads, flatten):
+    # Plates are compiled with the same thread count, so the compiled cache is cleared first.
+    _COMPILED_TEMPLATES.clear()
+    compiled = load_compiled_template(template, flatten=flatten, threads=threads)
+    base = load_source(base_path, compiled.template, compiled.canvas).image
+    return pixels(compose_compiled(base, compiled, variables, threads=threads))
+
+
+@pytest.mark.parametrize("flatten", [True, False])
+@pytest.mark.parametrize("soft", [False, True])
+@pytest.mark.parametrize("name", BUNDLED)
+def test_layer_threads_match_sequential(name, soft, flatten, tmp_path, sample_assets):
+    template = soft_template(name, tmp_path) if soft else template_path(name)
+    variables = template_vars(name)
+    expected = render(template, variables, sample_assets, 0, flatten)
+    assert np.array_equal(render(template, variables, sample_assets, 4, flatten), expected)
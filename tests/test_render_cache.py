@@ -0,0 +1,30 @@
+from conftest import template_path, template_vars
+from python.generate_thumbnail import generate
+from python.render_cache import RenderCache
+from python.render_thumbnail import render_thumbnail
+
+
+def test_render_thumbnail_hit_matches_miss(tmp_path, sample_assets):
+    cache = RenderCache(tmp_path / "cache")
+    name = "split_screen_classic"
+    first = render_thumbnail(sample_assets, template_path(name), template_vars(name), tmp_path / "a.png", cache=cache)
+    second = render_thumbnail(sample_assets, template_path(name), template_vars(name), tmp_path / "b.png", cache=cache)
+    assert (first["cache"], second["cache"]) == ("miss", "hit")
+    assert (tmp_path / "a.png").read_bytes() == (tmp_path / "b.png").read_bytes()
+
+
+def test_generate_hit_writes_requested_path(tmp_path, sample_assets):
+    payload = {
+        "image_path": str(sample_assets),
+        "main_title": "Cache check",
+        "left_caption": "left",
+        "right_caption": "right",
+        "cache_dir": str(tmp_path / "cache"),
+    }
+    first = generate(dict(payload, output_path=str(tmp_path / "a.jpg")))
+    second = generate(dict(payload, output_path=str(tmp_path / "b.jpg")))
+    in_memory = generate(payload)
+    assert (first["cache"], second["cache"], in_memory["cache"]) == ("miss", "hit", "hit")
+    assert first["output_path"] == str(tmp_path / "a.jpg")
+    assert second["output_path"] == str(tmp_path / "b.jpg")
+    assert (tmp_path / "a.jpg").read_bytes() == (tmp_path / "b.jpg").read_bytes() == in_memory["data"]